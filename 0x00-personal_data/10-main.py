@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Main file
+Benchmark redact_csv throughput on a synthetic export
+built from user_data.csv rows.
+Usage: ./10-main.py [SIZE_MB] (default: 2048)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+redact_csv = __import__('redact_csv').redact_csv
+
+size_mb = int(sys.argv[1]) if len(sys.argv) > 1 else 2048
+
+with open("user_data.csv", "rb") as f:
+    header = f.readline()
+    rows = f.read()
+
+with tempfile.TemporaryDirectory() as tmp:
+    src = os.path.join(tmp, "users.csv")
+    dst = os.path.join(tmp, "users_redacted.csv")
+    with open(src, "wb") as f:
+        f.write(header)
+        block = rows * max(1, (16 * 1024 * 1024) // len(rows))
+        while f.tell() < size_mb * 1024 * 1024:
+            f.write(block)
+
+    for workers in sorted({1, os.cpu_count() or 1}):
+        start = time.perf_counter()
+        size = redact_csv(src, dst, workers=workers)
+        elapsed = time.perf_counter() - start
+        print("{} worker(s): {:.0f} MB in {:.2f}s, {:.1f} MB/s".format(
+            workers, size / 1e6, elapsed, size / 1e6 / elapsed))
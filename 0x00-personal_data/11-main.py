@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Main file
+Check that records reaching a logger with three redacting handlers
+are only redacted once, without patching the formatters.
+"""
+
+import io
+import logging
+
+RedactingFormatter = __import__('filtered_logger').RedactingFormatter
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+
+formatters = [RedactingFormatter(fields=list(PII_FIELDS)) for _ in range(3)]
+print("Same fields share one cached redactor: {}".format(
+    all(formatter._redact is formatters[0]._redact
+        for formatter in formatters)))
+
+
+class Keep(logging.Handler):
+    """ Keep the records, after the other handlers formatted them. """
+
+    def __init__(self):
+        """ Initialize the list of records. """
+        super(Keep, self).__init__()
+        self.records = []
+
+    def emit(self, record):
+        """ Keep a record. """
+        self.records.append(record)
+
+
+logger = logging.getLogger("three_handlers")
+logger.setLevel(logging.DEBUG)
+logger.propagate = False
+for level, formatter in zip((logging.DEBUG, logging.INFO, logging.WARNING),
+                            formatters):
+    handler = logging.StreamHandler(io.StringIO())
+    handler.setLevel(level)
+    handler.setFormatter(formatter)
+    logger.addHandler(handler)
+kept = Keep()
+logger.addHandler(kept)
+
+for i in range(10):
+    logger.info("name=Bob;email=bob%d@dylan.com;", i)
+print("10 INFO records marked as redacted by the shared redactor: {}".format(
+    all(record._redacted_by is formatters[0]._redact
+        for record in kept.records)))
+print(logger.handlers[0].stream.getvalue().splitlines()[0][-40:])
+
+# Redacting "name=***;" again would build a new message: the message
+# is the same object when the second formatter skips the redaction.
+record = logging.LogRecord("user_data", logging.INFO, None, None,
+                           "name=Bob;email=bob@dylan.com;", None, None)
+formatters[0].format(record)
+message = record.msg
+formatters[1].format(record)
+print("Second formatter, same fields, redacts again: {}".format(
+    record.msg is not message))
+RedactingFormatter(fields=["email"]).format(record)
+print("Formatter with other fields redacts again: {}".format(
+    record.msg is not message))
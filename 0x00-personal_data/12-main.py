@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Main file
+Benchmark batch password hashing and verification
+wall-clock time against the number of worker threads.
+"""
+
+import asyncio
+import os
+import time
+
+hash_passwords_batch = __import__('encrypt_password').hash_passwords_batch
+verify_batch = __import__('encrypt_password').verify_batch
+hash_passwords_batch_async = \
+    __import__('encrypt_password').hash_passwords_batch_async
+
+PASSWORDS = ["MyAmazingPassw0rd{}".format(i) for i in range(64)]
+
+cores = os.cpu_count() or 1
+workers = 1
+while True:
+    start = time.perf_counter()
+    hashed = hash_passwords_batch(PASSWORDS, max_workers=workers)
+    hashing = time.perf_counter() - start
+    start = time.perf_counter()
+    valid = verify_batch(zip(hashed, PASSWORDS), max_workers=workers)
+    verifying = time.perf_counter() - start
+    print("{:>3} worker(s): hash {:.2f}s, verify {:.2f}s, all valid: {}"
+          .format(workers, hashing, verifying, all(valid)))
+    if workers >= cores:
+        break
+    workers = min(workers * 2, cores)
+
+start = time.perf_counter()
+hashed = asyncio.run(hash_passwords_batch_async(PASSWORDS))
+print("async: hash {:.2f}s".format(time.perf_counter() - start))
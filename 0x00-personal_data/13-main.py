@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+Main file
+Benchmark the trie redaction strategy against the regex
+one at 5, 100 and 1000 PII fields.
+"""
+
+import logging
+import time
+
+RedactingFormatter = __import__('filtered_logger').RedactingFormatter
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+
+RECORDS = 5000
+MESSAGE = ("name=Bob; email=bob@dylan.com; phone=(473) 401-4253; "
+           "ssn=261-72-6780; password=K5?BMNv; "
+           "ip=60ed:c396:2ff:244:bbd0:9208:26f2:93ea; "
+           "last_login=2019-11-14 06:14:24; "
+           "user_agent=Mozilla/5.0 (X11; Linux x86_64);")
+
+for count in (5, 100, 1000):
+    # The real PII fields plus made-up compliance field names.
+    fields = list(PII_FIELDS) + ["pii_field_{}".format(i)
+                                 for i in range(count - len(PII_FIELDS))]
+    outputs = {}
+    for strategy in ("regex", "trie"):
+        formatter = RedactingFormatter(fields=fields, strategy=strategy)
+        records = [logging.LogRecord("user_data", logging.INFO, None, None,
+                                     MESSAGE, None, None)
+                   for _ in range(RECORDS)]
+        start = time.perf_counter()
+        for record in records:
+            formatter.format(record)
+        elapsed = time.perf_counter() - start
+        outputs[strategy] = records[0].msg
+        print("{:>4} fields {:>5}: {:>10.0f} records/s"
+              .format(count, strategy, RECORDS / elapsed))
+    print("{:>4} fields identical output: {}"
+          .format(count, outputs["regex"] == outputs["trie"]))
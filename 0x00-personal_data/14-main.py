@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Main file
+Benchmark value-based PII detection: the single combined
+scanner against one regex per detector, on realistic log lines.
+"""
+
+import random
+import re
+import time
+
+VALUE_DETECTORS = __import__('filtered_logger').VALUE_DETECTORS
+VALUE_BOUNDARY = __import__('filtered_logger').VALUE_BOUNDARY
+get_value_scanner = __import__('filtered_logger').get_value_scanner
+
+LINES = 100000
+# Lines per second the combined scanner is expected to sustain.
+TARGET = 150000
+TEMPLATES = (
+    "Password reset requested for {email} from {ip}",
+    "Login failed for {email}: wrong password (attempt 3)",
+    "Support ticket: customer calls back on {phone} about order 42",
+    "KYC check passed, ssn {ssn} matched for account {id}",
+    "GET /api/v1/users/{id} 200 12ms user_agent=Mozilla/5.0 (X11)",
+    "Session {id} expired after 3600 seconds",
+)
+
+rng = random.Random(0)
+lines = [rng.choice(TEMPLATES).format(
+    email="user{}@example.com".format(rng.randint(0, 10 ** 6)),
+    ip=":".join("{:x}".format(rng.getrandbits(16)) for _ in range(8)),
+    phone="({}) {}-{}".format(rng.randint(200, 999), rng.randint(200, 999),
+                              rng.randint(1000, 9999)),
+    ssn="{}-{}-{}".format(rng.randint(100, 999), rng.randint(10, 99),
+                          rng.randint(1000, 9999)),
+    id=rng.getrandbits(64)) for _ in range(LINES)]
+
+scanner = get_value_scanner(tuple(VALUE_DETECTORS), "***")
+separate = [re.compile(VALUE_BOUNDARY + '(?:{})'.format(pattern))
+            for pattern in VALUE_DETECTORS.values()]
+
+start = time.perf_counter()
+combined_out = [scanner(line) for line in lines]
+combined = LINES / (time.perf_counter() - start)
+
+start = time.perf_counter()
+separate_out = []
+for line in lines:
+    for pattern in separate:
+        line = pattern.sub("***", line)
+    separate_out.append(line)
+per_detector = LINES / (time.perf_counter() - start)
+
+print("combined scanner: {:>10.0f} lines/s".format(combined))
+print("one per detector: {:>10.0f} lines/s".format(per_detector))
+print("identical output: {}".format(combined_out == separate_out))
+print("target {} lines/s met: {}".format(TARGET, combined >= TARGET))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+"""
+Main file
+Check the pooled connections offline, on the SQLite stand-in:
+checkout and return, exhaustion, reconnection on borrow of a
+closed connection, and return when the with block raises.
+"""
+
+import os
+import tempfile
+
+filtered_logger = __import__('filtered_logger')
+SQLiteConnectionPool = filtered_logger.SQLiteConnectionPool
+PoolError = filtered_logger.PoolError
+pooled_db = filtered_logger.pooled_db
+
+with tempfile.TemporaryDirectory() as tmp:
+    pool = SQLiteConnectionPool(os.path.join(tmp, "users.db"), pool_size=2)
+
+    with pooled_db(pool) as db:
+        db.execute("CREATE TABLE users (name TEXT, email TEXT);")
+        db.execute("INSERT INTO users VALUES ('Bob', 'bob@dylan.com');")
+        db.commit()
+        print("Checked out, 1 left in the pool: {}".format(
+            pool._cnx_queue.qsize() == 1))
+    print("Returned, 2 in the pool: {}".format(pool._cnx_queue.qsize() == 2))
+
+    first = pool.get_connection()
+    second = pool.get_connection()
+    try:
+        pool.get_connection()
+        print("Exhausted pool raises PoolError: False")
+    except PoolError:
+        print("Exhausted pool raises PoolError: True")
+    first.close()
+    second.close()
+
+    # Close the connections under the pool, as a server timeout would.
+    for cnx in list(pool._cnx_queue.queue):
+        cnx.close()
+    with pooled_db(pool) as db:
+        print("Closed connection reopened on borrow: {}".format(
+            db.execute("SELECT name FROM users;").fetchall() == [("Bob",)]))
+
+    try:
+        with pooled_db(pool) as db:
+            raise RuntimeError("query failed")
+    except RuntimeError:
+        pass
+    print("Returned after an exception, 2 in the pool: {}".format(
+        pool._cnx_queue.qsize() == 2))
@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Main file
+Check the bcrypt cost calibration: the calibrated cost is in range
+and hashes within the latency budget, and stored hashes made with
+another cost, or malformed, are flagged for re-hashing.
+"""
+
+import os
+import time
+
+import bcrypt
+
+encrypt_password = __import__('encrypt_password')
+calibrate_cost = encrypt_password.calibrate_cost
+get_cost = encrypt_password.get_cost
+needs_rehash = encrypt_password.needs_rehash
+MIN_COST = encrypt_password.MIN_COST
+MAX_COST = encrypt_password.MAX_COST
+DEFAULT_COST = encrypt_password.DEFAULT_COST
+
+budget_ms = 50.0
+cost = calibrate_cost(budget_ms)
+print("Calibrated cost in range: {}".format(MIN_COST <= cost <= MAX_COST))
+
+start = time.perf_counter()
+bcrypt.hashpw(b"MyAmazingPassw0rd", bcrypt.gensalt(rounds=cost))
+elapsed_ms = (time.perf_counter() - start) * 1000
+# A cost of MIN_COST is kept even when it does not fit
+print("Hashing fits the budget: {}".format(
+    cost == MIN_COST or elapsed_ms <= budget_ms * 1.5))
+print("Calibration cached: {}".format(calibrate_cost(budget_ms) == cost))
+
+os.environ.pop("BCRYPT_LATENCY_BUDGET_MS", None)
+print("Default cost without a budget: {}".format(get_cost() == DEFAULT_COST))
+os.environ["BCRYPT_LATENCY_BUDGET_MS"] = str(budget_ms)
+print("Calibrated cost with a budget: {}".format(get_cost() == cost))
+
+current = bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=cost))
+print("Current cost kept: {}".format(not needs_rehash(current)))
+other = bcrypt.hashpw(b"pw", bcrypt.gensalt(rounds=cost + 1))
+print("Other cost re-hashed: {}".format(needs_rehash(other)))
+print("Malformed hash re-hashed: {}".format(needs_rehash(b"not a hash")))
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Main file
+Check that rows logged as LogRow records keep the text of their
+format string and are redacted by column name, with get_logger
+and with get_logger(queued=True).
+"""
+
+import io
+import logging
+
+filtered_logger = __import__('filtered_logger')
+get_logger = filtered_logger.get_logger
+LogRow = filtered_logger.LogRow
+
+row = LogRow([("name", "Bob"), ("email", "bob@dylan.com"),
+              ("ip", "60ed:c396:2ff:244:bbd0:9208:26f2:93ea"),
+              ("last_login", "2019-11-14 06:14:24")])
+expected = [
+    "row name=***; email=***; ip=60ed:c396:2ff:244:bbd0:9208:26f2:93ea; "
+    "last_login=2019-11-14 06:14:24",
+    "login of *** at 2019-11-14 06:14:24",
+]
+
+for queued in (False, True):
+    logger = logging.getLogger("user_data")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger = get_logger(queued=queued)
+    handler = logger.handlers[0]
+    stream = io.StringIO()
+    getattr(handler, "target", handler).setStream(stream)
+
+    logger.info("row %s", row)
+    logger.info("login of %(name)s at %(last_login)s", row)
+    # Wait for the queued records to be written
+    handler.close()
+    messages = [line.split(": ", 1)[1]
+                for line in stream.getvalue().splitlines()]
+    print("{}: {}".format("queued" if queued else "direct",
+                          messages == expected))
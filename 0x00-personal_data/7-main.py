@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Main file
+Benchmark RedactingFormatter records/second before and after
+caching the compiled redaction pattern.
+"""
+
+import logging
+import random
+import re
+import time
+
+RedactingFormatter = __import__('filtered_logger').RedactingFormatter
+PII_FIELDS = __import__('filtered_logger').PII_FIELDS
+
+COLUMNS = ("name", "email", "phone", "ssn", "password",
+           "ip", "last_login", "user_agent")
+RECORDS = 50000
+
+
+def legacy_filter_datum(fields, redaction, message, separator):
+    """ filter_datum as it was before the redactor cache. """
+    fields_pattern = '|'.join(fields)
+    regex_pattern = r'({})=.+?{}'.format(fields_pattern, separator)
+    replacement_pattern = r'\1={}{}'.format(redaction, separator)
+    obfuscated_message = re.sub(regex_pattern, replacement_pattern, message)
+    return re.sub(r'({})=.+?{}'.format('|'.join(fields),
+                  separator), r'\1={}{}'.format(redaction,
+                                                separator), message)
+
+
+class LegacyFormatter(RedactingFormatter):
+    """ RedactingFormatter rebuilding its regex on every record. """
+
+    def format(self, record):
+        """ Format the record with the legacy filter_datum. """
+        record.msg = legacy_filter_datum(self.fields, self.REDACTION,
+                                         record.getMessage(), self.SEPARATOR)
+        return logging.Formatter.format(self, record)
+
+
+def synthetic_message(rng):
+    """ Build a log message shaped like a row of user_data.csv. """
+    row = ("User {}".format(rng.randint(0, 10 ** 6)),
+           "user{}@example.com".format(rng.randint(0, 10 ** 6)),
+           "({}) {}-{}".format(rng.randint(200, 999), rng.randint(200, 999),
+                               rng.randint(1000, 9999)),
+           "{}-{}-{}".format(rng.randint(100, 999), rng.randint(10, 99),
+                             rng.randint(1000, 9999)),
+           "pw{}".format(rng.getrandbits(32)),
+           ":".join("{:x}".format(rng.getrandbits(16)) for _ in range(8)),
+           "2019-11-14 06:14:24",
+           "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36")
+    return ";".join("{}={}".format(c, v) for c, v in zip(COLUMNS, row)) + ";"
+
+
+def bench(formatter, messages):
+    """ Return the records/second formatter achieves on messages. """
+    records = [logging.LogRecord("user_data", logging.INFO, None, None,
+                                 message, None, None) for message in messages]
+    start = time.perf_counter()
+    for record in records:
+        formatter.format(record)
+    return len(records) / (time.perf_counter() - start)
+
+
+rng = random.Random(0)
+messages = [synthetic_message(rng) for _ in range(RECORDS)]
+before = bench(LegacyFormatter(fields=list(PII_FIELDS)), messages)
+after = bench(RedactingFormatter(fields=list(PII_FIELDS)), messages)
+print("before: {:>10.0f} records/s".format(before))
+print("after:  {:>10.0f} records/s".format(after))
+print("speedup: {:.2f}x".format(after / before))
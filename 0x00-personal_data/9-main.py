@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""
+Main file
+Stream user_data.csv through filtered_logger.main
+using the SQLite stand-in instead of MySQL.
+"""
+
+import csv
+
+get_sqlite_db = __import__('filtered_logger').get_sqlite_db
+main = __import__('filtered_logger').main
+
+with open("user_data.csv") as f:
+    rows = list(csv.reader(f))
+
+db = get_sqlite_db()
+db.execute("CREATE TABLE users ({});".format(", ".join(rows[0])))
+db.executemany("INSERT INTO users VALUES ({});"
+               .format(", ".join("?" * len(rows[0]))), rows[1:])
+
+main(db, batch_size=4)
@@ -1,12 +1,91 @@
 #!/usr/bin/env python3
 """
 This module provides functions to securely
-hash passwords and verify them using bcrypt.
+hash passwords and verify them using bcrypt,
+one at a time, in batches over a thread pool,
+or from an asyncio event loop, with a bcrypt cost
+optionally calibrated to a latency budget.
 """
 
+import asyncio
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache
+import os
+import time
+from typing import Iterable, List, Optional, Tuple
+
 import bcrypt
 
 
+# Cost (log2 rounds) bcrypt.gensalt uses by default.
+DEFAULT_COST = 12
+# Range of costs bcrypt accepts.
+MIN_COST = 4
+MAX_COST = 31
+
+
+@lru_cache(maxsize=None)
+def calibrate_cost(budget_ms: float) -> int:
+    """
+    Measures bcrypt on the current host and picks the highest cost
+    whose hashing time fits in the latency budget. The result is
+    cached for the life of the process.
+
+    Each extra cost level doubles the hashing time, so costs are
+    tried in increasing order until the next one would not fit.
+
+    Args:
+        budget_ms (float): The hashing latency budget in milliseconds.
+
+    Returns:
+        int: The calibrated cost, at least MIN_COST.
+    """
+    cost = MIN_COST
+    while cost < MAX_COST:
+        salt = bcrypt.gensalt(rounds=cost)
+        start = time.perf_counter()
+        bcrypt.hashpw(b"calibration password", salt)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        if elapsed_ms * 2 > budget_ms:
+            break
+        cost += 1
+    return cost
+
+
+def get_cost() -> int:
+    """
+    Returns the cost new hashes are made with: calibrated against
+    the BCRYPT_LATENCY_BUDGET_MS environment variable when it is
+    set (e.g. 50), DEFAULT_COST otherwise.
+
+    Returns:
+        int: The bcrypt cost to hash with.
+    """
+    budget_ms = os.getenv("BCRYPT_LATENCY_BUDGET_MS")
+    if budget_ms is None:
+        return DEFAULT_COST
+    return calibrate_cost(float(budget_ms))
+
+
+def needs_rehash(hashed_password: bytes) -> bool:
+    """
+    Tells whether a stored hash was made with a different cost
+    than get_cost() and should be re-hashed at the next login.
+
+    Args:
+        hashed_password (bytes): The stored bcrypt hash,
+        e.g. b"$2b$12$...".
+
+    Returns:
+        bool: True if the hash's cost differs from the current one.
+    """
+    try:
+        cost = int(hashed_password.split(b"$")[2])
+    except (IndexError, ValueError):
+        return True
+    return cost != get_cost()
+
+
 def hash_password(password: str) -> bytes:
     """
     Hashes a password using bcrypt with a generated salt.
@@ -17,8 +96,8 @@ def hash_password(password: str) -> bytes:
     Returns:
         bytes: The salted and hashed password.
     """
-    # Generate a salt for bcrypt
-    salt = bcrypt.gensalt()
+    # Generate a salt for bcrypt with the current cost
+    salt = bcrypt.gensalt(rounds=get_cost())
     # Hash the password with the generated salt
     hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
     return hashed
@@ -38,3 +117,129 @@ def is_valid(hashed_password: bytes, password: str) -> bool:
     """
     # Check if the provided password matches the hashed password
     return bcrypt.checkpw(password.encode('utf-8'), hashed_password)
+
+
+def _is_valid_pair(pair: Tuple[bytes, str]) -> bool:
+    """
+    Validates a (hashed_password, password) pair with is_valid.
+
+    Args:
+        pair (Tuple[bytes, str]): The hashed and plain-text passwords.
+
+    Returns:
+        bool: True if the password is valid, False otherwise.
+    """
+    return is_valid(*pair)
+
+
+def hash_passwords_batch(passwords: Iterable[str],
+                         max_workers: Optional[int] = None) -> List[bytes]:
+    """
+    Hashes many passwords in parallel over a thread pool.
+    bcrypt releases the GIL while hashing, so threads run
+    on all cores without the cost of extra processes.
+
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        max_workers (Optional[int]): The number of threads
+        (default: the number of CPUs).
+
+    Returns:
+        List[bytes]: The hashed passwords, in input order.
+    """
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+        return list(executor.map(hash_password, passwords))
+
+
+def verify_batch(pairs: Iterable[Tuple[bytes, str]],
+                 max_workers: Optional[int] = None) -> List[bool]:
+    """
+    Validates many passwords in parallel over a thread pool.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): The hashed and
+        plain-text password pairs to validate.
+        max_workers (Optional[int]): The number of threads
+        (default: the number of CPUs).
+
+    Returns:
+        List[bool]: Whether each password is valid, in input order.
+    """
+    with ThreadPoolExecutor(max_workers or os.cpu_count()) as executor:
+        return list(executor.map(_is_valid_pair, pairs))
+
+
+async def hash_password_async(password: str,
+                              executor: Optional[Executor] = None) -> bytes:
+    """
+    Hashes a password without blocking the running event loop.
+
+    Args:
+        password (str): The password to hash.
+        executor (Optional[Executor]): The executor to hash in
+        (default: the event loop's default executor).
+
+    Returns:
+        bytes: The salted and hashed password.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, hash_password, password)
+
+
+async def is_valid_async(hashed_password: bytes, password: str,
+                         executor: Optional[Executor] = None) -> bool:
+    """
+    Validates a password without blocking the running event loop.
+
+    Args:
+        hashed_password (bytes): The hashed password
+        to compare against.
+        password (str): The plain-text password to validate.
+        executor (Optional[Executor]): The executor to validate in
+        (default: the event loop's default executor).
+
+    Returns:
+        bool: True if the password is valid, False otherwise.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(executor, is_valid,
+                                      hashed_password, password)
+
+
+async def hash_passwords_batch_async(
+        passwords: Iterable[str],
+        executor: Optional[Executor] = None) -> List[bytes]:
+    """
+    Hashes many passwords concurrently from an event loop.
+
+    Args:
+        passwords (Iterable[str]): The passwords to hash.
+        executor (Optional[Executor]): The executor to hash in
+        (default: the event loop's default executor).
+
+    Returns:
+        List[bytes]: The hashed passwords, in input order.
+    """
+    return list(await asyncio.gather(
+        *(hash_password_async(password, executor)
+          for password in passwords)))
+
+
+async def verify_batch_async(
+        pairs: Iterable[Tuple[bytes, str]],
+        executor: Optional[Executor] = None) -> List[bool]:
+    """
+    Validates many passwords concurrently from an event loop.
+
+    Args:
+        pairs (Iterable[Tuple[bytes, str]]): The hashed and
+        plain-text password pairs to validate.
+        executor (Optional[Executor]): The executor to validate in
+        (default: the event loop's default executor).
+
+    Returns:
+        List[bool]: Whether each password is valid, in input order.
+    """
+    return list(await asyncio.gather(
+        *(is_valid_async(hashed, password, executor)
+          for hashed, password in pairs)))
@@ -2,33 +2,76 @@
 """
 This module:
 - contains a function to obfuscate
-specific fields in a log message.
+specific fields in a log message, compiling
+and caching the redaction pattern once per set of fields.
 - defines a RedactingFormatter class to filter
-sensitive information from log messages.
+sensitive information from log messages, using a regex,
+a regex-free tokenizing or a trie-based redaction strategy,
+and optionally redacting emails, SSNs and phone numbers by value.
 - provides a logger that obfuscates
-sensitive information in logs.
+sensitive information in logs, optionally on
+a background thread behind a bounded queue.
 - provides a function to securely connect to a
 MySQL database using environment variables.
-- connects to a database, retrieves user data,
-and logs it with sensitive fields obfuscated.
+- provides a process-wide pool of database connections.
+- provides SQLite stand-ins for the database connection and pool.
+- connects to a database, streams user data in batches,
+and logs it as structured rows with the PII columns obfuscated.
 """
 
+from contextlib import contextmanager
+from functools import lru_cache, partial
 import logging
+from logging.handlers import QueueHandler, QueueListener
 import mysql.connector
 from mysql.connector import connection
 from mysql.connector.connection import MySQLConnection
+from mysql.connector.errors import PoolError
+from mysql.connector.pooling import MySQLConnectionPool
 # from mysql.connector.abstracts import MySQLConnectionAbstract
 # from mysql.connector import MySQLConnection
 # from mysql.connector.pooling import PooledMySQLConnection
 import os
+from queue import Empty, Full, Queue
 import re
-from typing import cast, List, Tuple
+import sqlite3
+import threading
+from typing import (cast, Any, Callable, Dict, Iterator,
+                    List, Optional, Tuple)
 # from typing import Union
 
 
 # Define a constant tuple for PII fields that should be redacted in logs.
 PII_FIELDS: Tuple[str, ...] = ("name", "email", "phone", "ssn", "password")
 
+# Patterns of PII values redacted wherever they appear, key or not,
+# in the formats found in user_data.csv. They only match at the
+# start of a token, i.e. after VALUE_BOUNDARY.
+VALUE_DETECTORS: Dict[str, str] = {
+    "email": r"[\w.%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}",
+    "ssn": r"\d{3}-\d{2}-\d{4}\b",
+    "phone": r"\(\d{3}\) ?\d{3}-\d{4}\b|\d{3}-\d{3}-\d{4}\b",
+}
+# Shared by all detectors: checking it once per position, before
+# trying any of them, keeps the combined scanner fast mid-word.
+VALUE_BOUNDARY = r"(?<![\w.%+-])"
+
+# Maximum number of compiled redaction patterns kept in memory.
+REDACTOR_CACHE_SIZE = 128
+
+# Default number of rows fetched per batch when streaming users.
+BATCH_SIZE = 1000
+
+# Default maximum number of pending records in a queued logger.
+QUEUE_SIZE = 10000
+
+# What a queued logger does when its queue is full.
+OVERFLOW_POLICIES: Tuple[str, ...] = ("block", "drop_oldest", "count")
+
+# Process-wide MySQL connection pool, created on first use.
+_db_pool: Optional[MySQLConnectionPool] = None
+_db_pool_lock = threading.Lock()
+
 
 def filter_datum(fields: List[str], redaction: str,
                  message: str, separator: str) -> str:
@@ -45,28 +88,277 @@ def filter_datum(fields: List[str], redaction: str,
     Returns:
         str: The log message with obfuscated fields.
     """
+    # Reuse the compiled pattern for this combination of arguments.
+    return get_redactor(tuple(fields), redaction, separator)(message)
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def get_redactor(fields: Tuple[str, ...], redaction: str,
+                 separator: str) -> Callable[[str], str]:
+    """
+    Compile the redaction regex for a combination of
+    fields, redaction and separator, once.
+
+    The result is kept in a bounded LRU cache, so repeated calls
+    with the same arguments share a single compiled pattern.
+
+    Args:
+        fields (Tuple[str, ...]): The fields to obfuscate.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character separating
+        the fields in the log message.
+
+    Returns:
+        Callable[[str], str]: A function that takes a log message
+        and returns it with the fields obfuscated.
+    """
     # Create a regex pattern that matches
     # any of the fields to be obfuscated.
     # The pattern looks for 'field_name=' followed by
     # any character until it reaches the separator.
     # Join all field names with '|' to create alternatives in regex.
-    fields_pattern = '|'.join(fields)
-    # Create the full regex pattern.
-    regex_pattern = r'({})=.+?{}'.format(fields_pattern, separator)
+    pattern = re.compile(r'({})=.+?{}'.format('|'.join(fields), separator))
 
     # Create the replacement pattern, which keeps the field name
     # but replaces its value with the redaction string.
-    replacement_pattern = r'\1={}{}'.format(redaction, separator)
+    replacement = r'\1={}{}'.format(redaction, separator)
+
+    # Bind the replacement so callers only pass the message.
+    return partial(pattern.sub, replacement)
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def get_tokenizing_redactor(fields: Tuple[str, ...], redaction: str,
+                            separator: str) -> Callable[[str], str]:
+    """
+    Build a regex-free redactor for structured 'key=value'
+    messages such as the ones main() logs.
+
+    The message is split once on the separator, and in each token
+    the text before an '=' is checked for ending with a field name,
+    by looking its suffixes up in a frozenset of fields. Like the
+    regex, 'first_name=Bob;' is redacted for the field 'name', and
+    an empty value, as in 'name=;a=1;', takes the next token along.
+    The output is the same as filter_datum's.
 
-    # Use re.sub to replace the matched fields
-    # with their redacted versions in the message.
-    obfuscated_message = re.sub(regex_pattern, replacement_pattern, message)
+    Args:
+        fields (Tuple[str, ...]): The fields to obfuscate.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character separating
+        the fields in the log message.
+
+    Returns:
+        Callable[[str], str]: A function that takes a log message
+        and returns it with the fields obfuscated.
+    """
+    # Set lookups keep the cost independent of the number of fields,
+    # only of the number of distinct field lengths.
+    field_set = frozenset(fields)
+    lengths = sorted({len(field) for field in fields})
 
-    # Return the obfuscated message.
-    # return obfuscated_message
-    return re.sub(r'({})=.+?{}'.format('|'.join(fields),
-                  separator), r'\1={}{}'.format(redaction,
-                                                separator), message)
+    def find_field(token: str, following: Optional[str]) -> int:
+        """
+        Return the position of the first '=' of a token that ends
+        a field name and starts a value the regex redacts, or -1.
+        following is the next token, if a separator follows it.
+        """
+        equal = token.find('=')
+        while equal != -1:
+            key = token[:equal]
+            if any(key[len(key) - length:] in field_set
+                   for length in lengths if length <= len(key)):
+                # Like '.+?', the value has at least one character
+                # and no newline: an empty one runs over the separator
+                # to the end of the next token.
+                value = token[equal + 1:] or following
+                if value is not None and '\n' not in value:
+                    return equal
+            equal = token.find('=', equal + 1)
+        return -1
+
+    def redact(message: str) -> str:
+        """ Redact the values of the fields in a message. """
+        tokens = message.split(separator)
+        # The last token is not followed by a separator,
+        # so, like with the regex, it is never redacted.
+        i = 0
+        while i < len(tokens) - 1:
+            key, equal_sign, value = tokens[i].partition('=')
+            # Most keys are exactly a field: skip the suffix lookups.
+            if value and key in field_set and '\n' not in value:
+                tokens[i] = key + '=' + redaction
+            elif equal_sign:
+                following = tokens[i + 1] if i + 2 < len(tokens) else None
+                equal = find_field(tokens[i], following)
+                if equal == len(tokens[i]) - 1:
+                    # The redacted value is the separator and the next
+                    # token, which is not checked on its own.
+                    tokens[i] += redaction
+                    del tokens[i + 1]
+                elif equal != -1:
+                    tokens[i] = tokens[i][:equal + 1] + redaction
+            i += 1
+        return separator.join(tokens)
+
+    return redact
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def get_trie_redactor(fields: Tuple[str, ...], redaction: str,
+                      separator: str) -> Callable[[str], str]:
+    """
+    Build a redactor that finds the fields with a trie of their
+    reversed names instead of one alternation regex, so its cost
+    depends on the message length and not on the number of fields.
+
+    Each '=' in the message is found with str.find, then the trie
+    is walked backwards from it to check whether a field name
+    ends there.
+    The output is the same as filter_datum's when the fields and
+    the separator contain no regex metacharacters.
+
+    Args:
+        fields (Tuple[str, ...]): The fields to obfuscate.
+        redaction (str): The string to replace the field values with.
+        separator (str): The character separating
+        the fields in the log message.
+
+    Returns:
+        Callable[[str], str]: A function that takes a log message
+        and returns it with the fields obfuscated.
+    """
+    # Trie of the reversed field names, None marks the end of a name.
+    root: Dict[Any, Any] = {}
+    for field in fields:
+        node = root
+        for char in reversed(field):
+            node = node.setdefault(char, {})
+        node[None] = True
+
+    def redact(message: str) -> str:
+        """ Redact the values of the fields in a message. """
+        parts = []
+        # Start of the text not yet copied to parts.
+        start = 0
+        equal = message.find('=')
+        while equal != -1:
+            # Walk back from '=' until the text spells a field name,
+            # without reaching into an already redacted value.
+            node = root
+            i = equal - 1
+            while None not in node and i >= start and message[i] in node:
+                node = node[message[i]]
+                i -= 1
+            if None in node:
+                # Like '.+?', the value has at least one character
+                # and no newline, and ends at the next separator.
+                end = message.find(separator, equal + 2)
+                if end != -1 and message.find('\n', equal + 1, end) == -1:
+                    parts.append(message[start:equal + 1])
+                    parts.append(redaction + separator)
+                    start = end + len(separator)
+                    equal = message.find('=', start)
+                    continue
+            equal = message.find('=', equal + 1)
+        if not parts:
+            return message
+        parts.append(message[start:])
+        return ''.join(parts)
+
+    return redact
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def get_value_scanner(detectors: Tuple[str, ...],
+                      redaction: str) -> Callable[[str], str]:
+    """
+    Combine value detectors into one compiled scanner that
+    redacts every match in a single pass over the message.
+
+    Args:
+        detectors (Tuple[str, ...]): The names of the
+        VALUE_DETECTORS to combine.
+        redaction (str): The string to replace the matches with.
+
+    Returns:
+        Callable[[str], str]: A function that takes a log message
+        and returns it with the detected values obfuscated.
+    """
+    pattern = re.compile(VALUE_BOUNDARY + '(?:{})'.format('|'.join(
+        '(?:{})'.format(VALUE_DETECTORS[name]) for name in detectors)))
+    # Backslashes in the redaction must not be read as group references.
+    return partial(pattern.sub, redaction.replace('\\', r'\\'))
+
+
+@lru_cache(maxsize=REDACTOR_CACHE_SIZE)
+def chain_redactors(*redactors: Callable[[str], str]) -> Callable[[str], str]:
+    """
+    Combine redactors into one that applies them in order.
+
+    Args:
+        *redactors (Callable[[str], str]): The redactors to apply.
+
+    Returns:
+        Callable[[str], str]: The combined redactor.
+    """
+    def redact(message: str) -> str:
+        """ Apply each redactor to the message in turn. """
+        for redactor in redactors:
+            message = redactor(message)
+        return message
+
+    return redact
+
+
+# Redaction strategies selectable per RedactingFormatter.
+REDACTION_STRATEGIES: Dict[str, Callable[..., Callable[[str], str]]] = {
+    "regex": get_redactor,
+    "tokenize": get_tokenizing_redactor,
+    "trie": get_trie_redactor,
+}
+
+
+class LogRow(dict):
+    """ Mapping of column names to values for one database row,
+    logged as a structured record and rendered as 'col=val; col=val'. """
+
+    def __str__(self) -> str:
+        """ Render the row the way main() has always logged it. """
+        return "; ".join(f"{col}={val}" for col, val in self.items())
+
+
+def pii_indexes(columns: List[str],
+                fields: Tuple[str, ...] = PII_FIELDS) -> Tuple[int, ...]:
+    """
+    Find the positions of the PII columns in a result set.
+
+    Args:
+        columns (List[str]): The column names of the result set.
+        fields (Tuple[str, ...]): The fields to obfuscate.
+
+    Returns:
+        Tuple[int, ...]: The indexes of the columns to redact.
+    """
+    return tuple(i for i, col in enumerate(columns) if col in fields)
+
+
+def redact_row(row: Tuple, indexes: Tuple[int, ...],
+               redaction: str = "***") -> List:
+    """
+    Replace the values at the given indexes of a row.
+
+    Args:
+        row (Tuple): The row as returned by the cursor.
+        indexes (Tuple[int, ...]): The indexes of the columns to redact.
+        redaction (str): The string to replace the values with.
+
+    Returns:
+        List: The row with its PII values redacted.
+    """
+    values = list(row)
+    for index in indexes:
+        values[index] = redaction
+    return values
 
 
 class RedactingFormatter(logging.Formatter):
@@ -77,17 +369,65 @@ class RedactingFormatter(logging.Formatter):
     FORMAT = "[HOLBERTON] %(name)s %(levelname)s %(asctime)-15s: %(message)s"
     SEPARATOR = ";"
 
-    def __init__(self, fields: List[str]):
+    def __init__(self, fields: List[str], strategy: str = "regex",
+                 detect_values: bool = False):
         """
         Initialize the formatter with a list of fields to redact.
 
         Args:
             fields (List[str]): The list of fields
             to obfuscate in log messages.
+            strategy (str): The name of the redaction strategy,
+            one of REDACTION_STRATEGIES (default: "regex").
+            detect_values (bool): Whether to also redact the values
+            matching VALUE_DETECTORS, with or without a key.
         """
         super(RedactingFormatter, self).__init__(self.FORMAT)
+        if strategy not in REDACTION_STRATEGIES:
+            raise ValueError("Unknown redaction strategy: {}"
+                             .format(strategy))
         # Store the fields to be redacted.
         self.fields = fields
+        self.strategy = strategy
+        self._field_set = frozenset(fields)
+        # Build the redactor once for this formatter.
+        self._redact = REDACTION_STRATEGIES[strategy](
+            tuple(fields), self.REDACTION, self.SEPARATOR)
+        self._scan = None
+        if detect_values:
+            self._scan = get_value_scanner(tuple(VALUE_DETECTORS),
+                                           self.REDACTION)
+            self._redact = chain_redactors(self._redact, self._scan)
+
+    def redact(self, record: logging.LogRecord):
+        """
+        Redact the message of a log record in place, merging its
+        arguments into it.
+
+        Records logged with a LogRow argument are redacted by column
+        name, then merged into their format string, without running
+        the redactor. The record remembers which redactor it went
+        through, so when it reaches several handlers it is only
+        redacted once.
+
+        Args:
+            record (logging.LogRecord): The log record to redact.
+        """
+        if getattr(record, "_redacted_by", None) is self._redact:
+            return
+        if isinstance(record.args, LogRow):
+            # Structured row: look the column names up in the fields.
+            record.msg = str(record.msg) % LogRow(
+                (col, self.REDACTION if col in self._field_set else val)
+                for col, val in record.args.items())
+            if self._scan is not None:
+                record.msg = self._scan(record.msg)
+        else:
+            # Obfuscate the sensitive fields in the log message.
+            record.msg = self._redact(record.getMessage())
+        # The arguments are merged into the redacted message.
+        record.args = None
+        record._redacted_by = self._redact
 
     def format(self, record: logging.LogRecord) -> str:
         """
@@ -100,19 +440,137 @@ class RedactingFormatter(logging.Formatter):
             str: The formatted log message with
             redacted sensitive information.
         """
-        # Obfuscate the sensitive fields in the log message.
-        record.msg = filter_datum(self.fields, self.REDACTION,
-                                  record.getMessage(), self.SEPARATOR)
+        self.redact(record)
         # Format the log record using the parent class's format method.
         return super(RedactingFormatter, self).format(record)
 
 
-def get_logger() -> logging.Logger:
+class BoundedQueueHandler(QueueHandler):
+    """ Queue handler that hands records to a background
+    QueueListener through a bounded queue, applying an
+    overflow policy when the queue is full. """
+
+    def __init__(self, target: logging.Handler, queue_size: int = QUEUE_SIZE,
+                 overflow: str = "block"):
+        """
+        Initialize the handler and start its background listener.
+
+        Args:
+            target (logging.Handler): The handler that formats and
+            writes the records on the background thread.
+            queue_size (int): The maximum number of pending records.
+            overflow (str): What to do when the queue is full, one of
+            OVERFLOW_POLICIES: "block" waits for room, "drop_oldest"
+            discards the oldest pending record and "count" discards
+            the new record; both drop policies count into `dropped`.
+        """
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError("Unknown overflow policy: {}".format(overflow))
+        super(BoundedQueueHandler, self).__init__(Queue(queue_size))
+        self.target = target
+        self.overflow = overflow
+        # Number of records discarded because the queue was full.
+        self.dropped = 0
+        self.listener = _BlockingQueueListener(self.queue, target,
+                                               respect_handler_level=True)
+        self.listener.start()
+
+    def handle(self, record: logging.LogRecord) -> bool:
+        """
+        Drop records the target handler would filter out before
+        they are prepared and enqueued.
+
+        Args:
+            record (logging.LogRecord): The log record to handle.
+
+        Returns:
+            bool: Whether the record was handled.
+        """
+        if record.levelno < self.target.level or \
+                not self.target.filter(record):
+            return False
+        return super(BoundedQueueHandler, self).handle(record)
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        """
+        Prepare a record for the queue. QueueHandler merges the
+        arguments into the message, which would turn a LogRow into
+        plain text for the target's formatter: a record with a LogRow
+        argument is redacted by column name first, by the target's
+        RedactingFormatter.
+
+        Args:
+            record (logging.LogRecord): The log record to prepare.
+
+        Returns:
+            logging.LogRecord: The record to enqueue.
+        """
+        formatter = self.target.formatter
+        if isinstance(record.args, LogRow) and \
+                isinstance(formatter, RedactingFormatter):
+            formatter.redact(record)
+        return super(BoundedQueueHandler, self).prepare(record)
+
+    def enqueue(self, record: logging.LogRecord):
+        """
+        Enqueue a record, applying the overflow policy if the queue is full.
+
+        Args:
+            record (logging.LogRecord): The prepared log record.
+        """
+        if self.overflow == "block":
+            self.queue.put(record)
+            return
+        while True:
+            try:
+                self.queue.put_nowait(record)
+                return
+            except Full:
+                self.dropped += 1
+                if self.overflow == "count":
+                    return
+            # Make room by discarding the oldest pending record.
+            try:
+                self.queue.get_nowait()
+            except Empty:
+                pass
+
+    def close(self):
+        """
+        Stop the listener once every pending record has been written,
+        then close the handler. Called by logging.shutdown at exit.
+        """
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+        super(BoundedQueueHandler, self).close()
+
+
+class _BlockingQueueListener(QueueListener):
+    """ QueueListener whose stop sentinel waits for room
+    in a full queue instead of raising queue.Full. """
+
+    def enqueue_sentinel(self):
+        """ Enqueue the stop sentinel, blocking if the queue is full. """
+        self.queue.put(self._sentinel)
+
+
+def get_logger(queued: bool = False, queue_size: int = QUEUE_SIZE,
+               overflow: str = "block") -> logging.Logger:
     """
     Creates and configures a logger named 'user_data'
     with a StreamHandler and a RedactingFormatter
     that obfuscates sensitive information.
 
+    Args:
+        queued (bool): If True, redaction and output run on a
+        background thread behind a BoundedQueueHandler, so the
+        calling thread only pays for enqueuing the record.
+        queue_size (int): The maximum number of pending records
+        when queued.
+        overflow (str): The BoundedQueueHandler overflow policy
+        when queued.
+
     Returns:
         logging.Logger: Configured logger object instance.
     """
@@ -132,8 +590,12 @@ def get_logger() -> logging.Logger:
     # RedactingFormatter, passing in the PII_FIELDS.
     stream_handler.setFormatter(RedactingFormatter(fields=list(PII_FIELDS)))
 
-    # Add the handler to the logger.
-    logger.addHandler(stream_handler)
+    # Add the handler to the logger, behind a queue if requested.
+    if queued:
+        logger.addHandler(BoundedQueueHandler(stream_handler, queue_size,
+                                              overflow))
+    else:
+        logger.addHandler(stream_handler)
 
     # Return the configured logger.
     return logger
@@ -156,50 +618,248 @@ def get_db() -> connection.MySQLConnection:
         mysql.connector.connection.MySQLConnection:
         A MySQL database connection object.
     """
-    # Fetch environment variables for database connection details.
-    db_username = os.getenv("PERSONAL_DATA_DB_USERNAME", "root")
-    db_password = os.getenv("PERSONAL_DATA_DB_PASSWORD", "")
-    db_host = os.getenv("PERSONAL_DATA_DB_HOST", "localhost")
-    db_name = os.getenv("PERSONAL_DATA_DB_NAME")
-
     # Establish and return the database
     # connection using the provided credentials.
-    return cast(MySQLConnection, mysql.connector.connect(
-        user=db_username,
-        password=db_password,
-        host=db_host,
-        database=db_name
-    ))
+    return cast(MySQLConnection, mysql.connector.connect(**_db_config()))
+
+
+def _db_config() -> Dict[str, Optional[str]]:
+    """
+    Read the database connection details from environment variables.
+
+    Returns:
+        Dict[str, Optional[str]]: The mysql.connector connection arguments.
+    """
+    # Fetch environment variables for database connection details.
+    return {
+        "user": os.getenv("PERSONAL_DATA_DB_USERNAME", "root"),
+        "password": os.getenv("PERSONAL_DATA_DB_PASSWORD", ""),
+        "host": os.getenv("PERSONAL_DATA_DB_HOST", "localhost"),
+        "database": os.getenv("PERSONAL_DATA_DB_NAME"),
+    }
 
 
-def main():
+def get_db_pool() -> MySQLConnectionPool:
+    """
+    Return the process-wide MySQL connection pool, creating it on
+    first use with the credentials read by get_db and:
+    - PERSONAL_DATA_DB_POOL_NAME: The pool name (default: "personal_data").
+    - PERSONAL_DATA_DB_POOL_SIZE: The number of pooled connections
+    (default: 5).
+
+    Returns:
+        mysql.connector.pooling.MySQLConnectionPool: The connection pool.
+    """
+    global _db_pool
+    with _db_pool_lock:
+        if _db_pool is None:
+            _db_pool = MySQLConnectionPool(
+                pool_name=os.getenv("PERSONAL_DATA_DB_POOL_NAME",
+                                    "personal_data"),
+                pool_size=int(os.getenv("PERSONAL_DATA_DB_POOL_SIZE", "5")),
+                **_db_config())
+        return _db_pool
+
+
+class SQLiteConnectionPool():
+    """ Fixed-size pool of SQLite connections with the same
+    interface as MySQLConnectionPool, as a stand-in for it
+    in local runs and tests. """
+
+    def __init__(self, database: str = ":memory:",
+                 pool_name: str = "personal_data", pool_size: int = 5):
+        """
+        Initialize the pool and open its connections.
+
+        Args:
+            database (str): The path of the SQLite database file.
+            Each connection to ":memory:" gets its own database.
+            pool_name (str): The name of the pool.
+            pool_size (int): The number of pooled connections.
+        """
+        self.database = database
+        self.pool_name = pool_name
+        self.pool_size = pool_size
+        self._cnx_queue: Queue = Queue(pool_size)
+        for _ in range(pool_size):
+            self._cnx_queue.put(self._connect())
+
+    def _connect(self) -> sqlite3.Connection:
+        """ Open a new connection usable from any thread. """
+        return sqlite3.connect(self.database, check_same_thread=False)
+
+    def get_connection(self) -> "PooledSQLiteConnection":
+        """
+        Borrow a connection from the pool.
+
+        Returns:
+            PooledSQLiteConnection: A connection that returns
+            to the pool when closed.
+
+        Raises:
+            mysql.connector.errors.PoolError: If the pool is exhausted.
+        """
+        try:
+            return PooledSQLiteConnection(self, self._cnx_queue.get_nowait())
+        except Empty:
+            raise PoolError("Failed getting connection; pool exhausted")
+
+    def add_connection(self, cnx: sqlite3.Connection):
+        """
+        Return a connection to the pool.
+
+        Args:
+            cnx (sqlite3.Connection): The connection to return.
+        """
+        self._cnx_queue.put_nowait(cnx)
+
+
+class PooledSQLiteConnection():
+    """ SQLite connection borrowed from a SQLiteConnectionPool,
+    mirroring mysql.connector's PooledMySQLConnection. """
+
+    def __init__(self, pool: SQLiteConnectionPool, cnx: sqlite3.Connection):
+        """
+        Initialize the wrapper around a pooled connection.
+
+        Args:
+            pool (SQLiteConnectionPool): The pool the connection belongs to.
+            cnx (sqlite3.Connection): The underlying connection.
+        """
+        self._pool = pool
+        self._cnx = cnx
+
+    def __getattr__(self, attr: str) -> Any:
+        """ Delegate everything else to the underlying connection. """
+        return getattr(self._cnx, attr)
+
+    def ping(self, reconnect: bool = False, attempts: int = 1,
+             delay: int = 0):
+        """
+        Check the connection is usable, reconnecting if asked to.
+
+        Args:
+            reconnect (bool): Whether to reopen a broken connection.
+            attempts (int): Kept for compatibility with mysql.connector.
+            delay (int): Kept for compatibility with mysql.connector.
+
+        Raises:
+            sqlite3.Error: If the connection is broken and
+            reconnect is False.
+        """
+        try:
+            self._cnx.execute("SELECT 1;")
+        except sqlite3.Error:
+            if not reconnect:
+                raise
+            self._cnx = self._pool._connect()
+
+    def close(self):
+        """ Return the connection to its pool instead of closing it. """
+        if self._cnx is not None:
+            self._pool.add_connection(self._cnx)
+            self._cnx = None
+
+
+@contextmanager
+def pooled_db(pool: Any = None) -> Iterator[Any]:
+    """
+    Borrow a health-checked connection from a pool for
+    the duration of a with block, then return it.
+
+    Args:
+        pool: A MySQLConnectionPool or SQLiteConnectionPool
+        (default: get_db_pool()).
+
+    Yields:
+        A pooled connection, pinged (and reconnected if needed)
+        before it is handed out.
+    """
+    if pool is None:
+        pool = get_db_pool()
+    cnx = pool.get_connection()
+    try:
+        # Health check on borrow: reopen stale connections.
+        cnx.ping(reconnect=True)
+        yield cnx
+    finally:
+        # Closing a pooled connection returns it to the pool.
+        cnx.close()
+
+
+def get_sqlite_db(database: str = ":memory:") -> sqlite3.Connection:
+    """
+    Connect to a local SQLite database through the same DB-API
+    as get_db, as a stand-in for MySQL in local runs and tests.
+
+    Args:
+        database (str): The path of the SQLite database file
+        (default: an in-memory database).
+
+    Returns:
+        sqlite3.Connection: A SQLite database connection object.
+    """
+    return sqlite3.connect(database)
+
+
+def stream_rows(cursor: Any, batch_size: int = BATCH_SIZE) -> Iterator[Any]:
+    """
+    Yield the rows of an executed cursor, fetching them in
+    batches so that only one batch is held in memory at a time.
+
+    Args:
+        cursor: A DB-API cursor on which a query has been executed.
+        batch_size (int): The number of rows fetched per batch.
+
+    Yields:
+        The rows of the result set, in order.
+    """
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+
+def main(db: Any = None, batch_size: Optional[int] = None):
     """
     Main function that fetches user data from the database
     and logs it with sensitive fields obfuscated.
+
+    Rows are streamed in batches of PERSONAL_DATA_BATCH_SIZE rows
+    (default: BATCH_SIZE), so memory stays flat however large
+    the users table is.
+
+    Args:
+        db: A DB-API connection to read from (default: get_db()).
+        batch_size (Optional[int]): The number of rows fetched per batch.
     """
     # Get the database connection and logger.
-    db = get_db()
+    if db is None:
+        db = get_db()
     logger = get_logger()
+    if batch_size is None:
+        batch_size = int(os.getenv("PERSONAL_DATA_BATCH_SIZE", BATCH_SIZE))
 
     # Execute the SQL query to fetch all user data.
+    # mysql.connector cursors are unbuffered by default,
+    # so rows are read from the server as they are fetched.
     cursor = db.cursor()
     cursor.execute("SELECT * FROM users;")
 
     # Get column names to format the log message.
-    # columns = [desc[0] for desc in cursor.description]
-    # if cursor.description is not None else []
+    columns = []
     if cursor.description is not None:
-        columns = []
         for desc in cursor.description:
             columns.append(desc[0])
-        else:
-            columns = []
-
-    # Log each row with sensitive data obfuscated.
-    for row in cursor.fetchall():
-        message = "; ".join(f"{col}={val}" for col,
-                            val in zip(columns, row))
-        logger.info(message)
+    # Work out which columns hold PII once for the whole result set.
+    indexes = pii_indexes(columns)
+
+    # Log each row with sensitive data obfuscated. Rows are redacted
+    # before logging, so no record ever carries the PII values.
+    for row in stream_rows(cursor, batch_size):
+        logger.info("%s", LogRow(zip(columns, redact_row(
+            row, indexes, RedactingFormatter.REDACTION))))
 
     # Close the cursor and database connection.
     cursor.close()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+This module provides a command-line tool that redacts
+the PII_FIELDS columns of CSV exports shaped like
+user_data.csv, in parallel across a process pool.
+
+The input is memory-mapped and split into chunks on line
+boundaries, so records must not contain embedded newlines.
+Chunks are redacted by worker processes and written out
+in their original order.
+
+Usage: ./redact_csv.py input.csv output.csv [-w WORKERS] [-c CHUNK_MB]
+"""
+
+import argparse
+import csv
+import io
+import mmap
+from multiprocessing import Pool
+import os
+import time
+from typing import Iterator, List, Optional, Sequence, Tuple
+
+from filtered_logger import PII_FIELDS, RedactingFormatter
+
+
+# Default size of the chunks handed to worker processes.
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+def chunk_offsets(mm: mmap.mmap, start: int,
+                  chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, int]]:
+    """
+    Split a memory-mapped file into chunks ending on line boundaries.
+
+    Args:
+        mm (mmap.mmap): The memory-mapped input file.
+        start (int): The offset of the first byte to split.
+        chunk_size (int): The approximate size of each chunk in bytes.
+
+    Yields:
+        Tuple[int, int]: The start and end offsets of each chunk.
+    """
+    size = len(mm)
+    while start < size:
+        end = mm.find(b"\n", min(start + chunk_size, size) - 1)
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def redact_chunk(task: Tuple[str, int, int, Tuple[int, ...], str]) -> bytes:
+    """
+    Redact the PII columns of one chunk of a CSV file.
+
+    Workers map the file themselves, so only the offsets
+    cross the process boundary on the way in.
+
+    Args:
+        task (Tuple[str, int, int, Tuple[int, ...], str]): The input
+        path, the chunk start and end offsets, the indexes of the
+        columns to redact and the redaction string.
+
+    Returns:
+        bytes: The redacted chunk, encoded as UTF-8.
+    """
+    path, start, end, indexes, redaction = task
+    with open(path, "rb") as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            text = mm[start:end].decode("utf-8")
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_ALL, lineterminator="\n")
+    for row in csv.reader(io.StringIO(text, newline="")):
+        for index in indexes:
+            if index < len(row):
+                row[index] = redaction
+        writer.writerow(row)
+    return output.getvalue().encode("utf-8")
+
+
+def redact_csv(src: str, dst: str, fields: Sequence[str] = PII_FIELDS,
+               workers: Optional[int] = None,
+               chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Redact the given columns of a CSV file into another file.
+
+    Args:
+        src (str): The path of the CSV file to redact.
+        dst (str): The path of the redacted CSV file to write.
+        fields (Sequence[str]): The names of the columns to redact.
+        workers (Optional[int]): The number of worker processes
+        (default: the number of CPUs).
+        chunk_size (int): The approximate size of each chunk in bytes.
+
+    Returns:
+        int: The number of bytes read from src.
+    """
+    with open(src, "rb") as f, open(dst, "wb") as out:
+        if os.fstat(f.fileno()).st_size == 0:
+            return 0
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # The header is copied as is and names the columns to redact.
+            header_end = mm.find(b"\n") + 1 or len(mm)
+            header = mm[:header_end]
+            columns: List[str] = next(csv.reader(
+                [header.decode("utf-8").rstrip("\r\n")]))
+            indexes = tuple(i for i, column in enumerate(columns)
+                            if column in fields)
+            out.write(header)
+            tasks = ((src, start, end, indexes, RedactingFormatter.REDACTION)
+                     for start, end in chunk_offsets(mm, header_end,
+                                                     chunk_size))
+            with Pool(workers) as pool:
+                # imap yields results in task order.
+                for chunk in pool.imap(redact_chunk, tasks):
+                    out.write(chunk)
+            return len(mm)
+
+
+def main():
+    """
+    Parse the command-line arguments, redact the input file
+    and report the throughput.
+    """
+    parser = argparse.ArgumentParser(
+        description="Redact the PII columns of a CSV export.")
+    parser.add_argument("input", help="CSV file to redact")
+    parser.add_argument("output", help="redacted CSV file to write")
+    parser.add_argument("-w", "--workers", type=int, default=None,
+                        help="number of worker processes (default: CPUs)")
+    parser.add_argument("-c", "--chunk-mb", type=int,
+                        default=CHUNK_SIZE // (1024 * 1024),
+                        help="chunk size in MB (default: %(default)s)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    size = redact_csv(args.input, args.output, workers=args.workers,
+                      chunk_size=args.chunk_mb * 1024 * 1024)
+    elapsed = time.perf_counter() - start
+    print("{:.1f} MB in {:.2f}s: {:.1f} MB/s".format(
+        size / 1e6, elapsed, size / 1e6 / elapsed if elapsed else 0.0))
+
+
+if __name__ == "__main__":
+    main()
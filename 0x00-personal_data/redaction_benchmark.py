@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+This module is a benchmark suite for the redaction paths
+of filtered_logger: filter_datum, RedactingFormatter.format
+for each strategy, structured LogRow records, and loggers
+returned by get_logger.
+
+Records come from a deterministic generator following the
+user_data.csv schema. For every path the suite reports
+records/second, p50/p99 per-record latency, the memory blocks
+each record leaves allocated and the peak of memory in use while
+processing a record, and saves the results as JSON so runs can be
+compared over time.
+
+Usage: ./redaction_benchmark.py [-n RECORDS] [-s SEED] [-o OUTPUT]
+"""
+
+import argparse
+from datetime import datetime
+import json
+import logging
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Tuple
+
+from filtered_logger import (PII_FIELDS, REDACTION_STRATEGIES, LogRow,
+                             RedactingFormatter, filter_datum, get_logger)
+
+
+# Columns of user_data.csv, in order.
+COLUMNS: Tuple[str, ...] = ("name", "email", "phone", "ssn", "password",
+                            "ip", "last_login", "user_agent")
+FIRST_NAMES = ("Marlene", "Rhianna", "Belen", "Tanner", "Kaylee", "Ayla")
+LAST_NAMES = ("Wood", "Barrera", "Bailey", "Frost", "Dalton", "Sosa")
+DOMAINS = ("att.net", "me.com", "yahoo.com", "gmail.com", "hotmail.com")
+USER_AGENTS = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+    "(KHTML, like Gecko) Chrome/74.0.3729.157 Safari/537.36",
+    "Mozilla/5.0 (Linux; U; Android 4.1.2; de-de; GT-I9100 Build/JZO54K) "
+    "AppleWebKit/534.30 (KHTML, like Gecko) Version/4.0 Mobile "
+    "Safari/534.30",
+    "Mozilla/5.0 (Windows NT 5.1; rv:36.0) Gecko/20100101 Firefox/36.0",
+)
+
+
+def generate_records(count: int, seed: int = 0) -> Iterator[Tuple[str, ...]]:
+    """
+    Generate rows shaped like user_data.csv. The same seed
+    always yields the same rows.
+
+    Args:
+        count (int): The number of rows to generate.
+        seed (int): The seed of the random generator.
+
+    Yields:
+        Tuple[str, ...]: The values of a row, in COLUMNS order.
+    """
+    rng = random.Random(seed)
+    for _ in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield ("{} {}".format(first, last),
+               "{}{}@{}".format(first.lower(), rng.randint(0, 9999),
+                                rng.choice(DOMAINS)),
+               "({}) {}-{}".format(rng.randint(200, 999),
+                                   rng.randint(200, 999),
+                                   rng.randint(1000, 9999)),
+               "{}-{:02d}-{}".format(rng.randint(100, 999),
+                                     rng.randint(1, 99),
+                                     rng.randint(1000, 9999)),
+               "".join(rng.choice("abcdefghjkmnpqrstuvwxyz23456789^&?~")
+                       for _ in range(rng.randint(7, 9))),
+               ":".join("{:x}".format(rng.getrandbits(16))
+                        for _ in range(8)),
+               "2019-11-14 06:{:02d}:{:02d}".format(rng.randint(0, 59),
+                                                    rng.randint(0, 59)),
+               rng.choice(USER_AGENTS))
+
+
+def to_message(row: Tuple[str, ...]) -> str:
+    """
+    Render a row as the 'key=value;' message RedactingFormatter expects.
+
+    Args:
+        row (Tuple[str, ...]): The values of a row, in COLUMNS order.
+
+    Returns:
+        str: The log message.
+    """
+    return "".join("{}={};".format(col, val) for col, val in zip(COLUMNS, row))
+
+
+def _record(msg: str, args=None) -> logging.LogRecord:
+    """ Build a log record the way Logger.info would. """
+    return logging.LogRecord("user_data", logging.INFO, __file__, 0,
+                             msg, args, None)
+
+
+def _percentile(sorted_ns: List[int], percent: float) -> float:
+    """ Return a percentile of sorted latencies, in microseconds. """
+    index = min(len(sorted_ns) - 1, int(len(sorted_ns) * percent / 100))
+    return sorted_ns[index] / 1000
+
+
+def measure(run: Callable[[int], None], count: int) -> Dict[str, float]:
+    """
+    Measure a redaction path record by record.
+
+    Args:
+        run (Callable[[int], None]): Processes the record at an index.
+        count (int): The number of records to process.
+
+    Returns:
+        Dict[str, float]: records_per_sec, p50_us, p99_us,
+        allocations_per_record, the average number of memory blocks
+        still allocated after each record, from sys.getallocatedblocks:
+        records kept in a queue or a cache count, temporaries do not;
+        and peak_bytes_per_record, the average peak of traced memory
+        above what was in use before each record. This is how much
+        memory a record needs at once, not how much it allocates in
+        total: memory freed and allocated again is counted once.
+    """
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for i in range(count):
+        before = clock()
+        run(i)
+        latencies.append(clock() - before)
+    elapsed = (clock() - start) / 1e9
+    latencies.sort()
+
+    # Blocks are counted in a second pass, without tracemalloc,
+    # which allocates blocks of its own.
+    blocks = 0
+    for i in range(count):
+        before = sys.getallocatedblocks()
+        run(i)
+        blocks += sys.getallocatedblocks() - before
+
+    # Memory is traced in a third pass so that
+    # tracemalloc does not distort the timings.
+    tracemalloc.start()
+    peak = 0
+    for i in range(count):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        run(i)
+        peak += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    return {
+        "records_per_sec": round(count / elapsed, 1),
+        "p50_us": round(_percentile(latencies, 50), 2),
+        "p99_us": round(_percentile(latencies, 99), 2),
+        "allocations_per_record": round(blocks / count, 1),
+        "peak_bytes_per_record": round(peak / count, 1),
+    }
+
+
+def _null_logger(**kwargs) -> logging.Logger:
+    """ Return a fresh get_logger logger writing to os.devnull. """
+    logger = logging.getLogger("user_data")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+        handler.close()
+    logger = get_logger(**kwargs)
+    handler = logger.handlers[0]
+    target = getattr(handler, "target", handler)
+    target.setStream(open(os.devnull, "w"))
+    return logger
+
+
+def run_suite(count: int, seed: int = 0) -> Dict[str, Dict[str, float]]:
+    """
+    Benchmark every redaction path on the same generated records.
+
+    Args:
+        count (int): The number of records per path.
+        seed (int): The seed of the record generator.
+
+    Returns:
+        Dict[str, Dict[str, float]]: The measurements of each path.
+    """
+    rows = list(generate_records(count, seed))
+    messages = [to_message(row) for row in rows]
+    fields = list(PII_FIELDS)
+    paths: Dict[str, Callable[[int], None]] = {
+        "filter_datum": lambda i: filter_datum(
+            fields, RedactingFormatter.REDACTION, messages[i],
+            RedactingFormatter.SEPARATOR),
+    }
+    for strategy in REDACTION_STRATEGIES:
+        formatter = RedactingFormatter(fields, strategy=strategy)
+        paths["format[{}]".format(strategy)] = \
+            lambda i, f=formatter: f.format(_record(messages[i]))
+    detecting = RedactingFormatter(fields, detect_values=True)
+    paths["format[regex+detect_values]"] = \
+        lambda i: detecting.format(_record(messages[i]))
+    structured = RedactingFormatter(fields)
+    paths["format[LogRow]"] = lambda i: structured.format(
+        _record("%s", (LogRow(zip(COLUMNS, rows[i])),)))
+    logger = _null_logger()
+    paths["get_logger"] = lambda i: logger.info(messages[i])
+
+    results = {name: measure(run, count) for name, run in paths.items()}
+
+    # The queued logger is measured from the caller's side.
+    logger = _null_logger(queued=True, queue_size=count)
+    results["get_logger[queued]"] = measure(
+        lambda i: logger.info(messages[i]), count)
+    logger.handlers[0].close()
+    return results
+
+
+def main():
+    """
+    Run the suite, print a summary table and save the results as JSON.
+    """
+    parser = argparse.ArgumentParser(
+        description="Benchmark the personal_data redaction paths.")
+    parser.add_argument("-n", "--records", type=int, default=20000,
+                        help="records per path (default: %(default)s)")
+    parser.add_argument("-s", "--seed", type=int, default=0,
+                        help="record generator seed (default: %(default)s)")
+    parser.add_argument("-o", "--output", default=None,
+                        help="JSON results file (default: "
+                        "redaction_benchmark_<timestamp>.json)")
+    args = parser.parse_args()
+
+    now = datetime.now()
+    results = run_suite(args.records, args.seed)
+    print("{:<28} {:>12} {:>9} {:>9} {:>11} {:>12}".format(
+        "path", "records/s", "p50 us", "p99 us", "allocs/rec",
+        "peak B/rec"))
+    for name, result in results.items():
+        print("{:<28} {records_per_sec:>12.0f} {p50_us:>9.2f} "
+              "{p99_us:>9.2f} {allocations_per_record:>11.1f} "
+              "{peak_bytes_per_record:>12.0f}".format(name, **result))
+
+    output = args.output or "redaction_benchmark_{}.json".format(
+        now.strftime("%Y%m%dT%H%M%S"))
+    with open(output, "w") as f:
+        json.dump({
+            "timestamp": now.isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "records": args.records,
+            "seed": args.seed,
+            "results": results,
+        }, f, indent=2)
+    print("results saved to {}".format(output))
+
+
+if __name__ == "__main__":
+    main()
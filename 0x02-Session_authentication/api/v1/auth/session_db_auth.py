@@ -33,7 +33,7 @@ class SessionDBAuth(SessionExpAuth):
         if session_id is None:
             return None
 
-        UserSession.load_from_file()
+        UserSession.reload()
         sessions = UserSession.search({'session_id': session_id})
         if not sessions:
             return None
@@ -67,7 +67,7 @@ class SessionDBAuth(SessionExpAuth):
         if not self.user_id_for_session_id(session_id):
             return False
 
-        UserSession.load_from_file()
+        UserSession.reload()
         sessions = UserSession.search({'session_id': session_id})
         if not sessions:
             return False
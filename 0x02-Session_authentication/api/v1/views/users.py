@@ -1,19 +1,74 @@
 #!/usr/bin/env python3
 """ Module of Users views
 """
+import itertools
+import json
+from typing import Iterator
 from api.v1.views import app_views
-from flask import abort, jsonify, request
+from flask import Response, abort, jsonify, request
+from models.base import PAGE_SIZE
+from models.engine.storage import ORDERS, parse_cursor
 from models.user import User
 
 
 @app_views.route('/users', methods=['GET'], strict_slashes=False)
 def view_all_users() -> str:
     """ GET /api/v1/users
+    Query parameters (optional):
+      - limit: maximum number of users to return
+      - cursor: X-Next-Cursor header of the previous page
+      - order_by: id (default) or created_at
+      - stream: 1 to stream all users, without limit, in chunks
     Return:
-      - list of all User objects JSON represented
+      - list of User objects JSON represented, with the cursor of
+        the next page in the X-Next-Cursor header if there is one
+      - 400 if a query parameter is invalid
     """
-    all_users = [user.to_json() for user in User.all()]
-    return jsonify(all_users)
+    limit = request.args.get('limit')
+    cursor = request.args.get('cursor')
+    order_by = request.args.get('order_by', 'id')
+    stream = request.args.get('stream') == '1'
+    if limit is None and cursor is None and not stream:
+        all_users = [user.to_json() for user in User.all()]
+        return jsonify(all_users)
+    if order_by not in ORDERS:
+        return jsonify({'error': "order_by must be one of {}".format(
+            ", ".join(ORDERS))}), 400
+    if limit is not None:
+        # isdigit alone also accepts digits int cannot parse, like "²"
+        if not (limit.isascii() and limit.isdigit()) or int(limit) < 1:
+            return jsonify({'error': "limit must be a positive integer"}), 400
+        limit = int(limit)
+    if cursor is not None:
+        try:
+            parse_cursor(cursor, order_by)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    if stream and limit is None:
+        return Response(_stream_users(cursor, order_by),
+                        mimetype='application/json')
+    users, next_cursor = User.page(limit, cursor, order_by)
+    response = jsonify([user.to_json() for user in users])
+    if next_cursor is not None:
+        response.headers['X-Next-Cursor'] = next_cursor
+    return response
+
+
+def _stream_users(cursor: str, order_by: str) -> Iterator[str]:
+    """ Yield the JSON list of users one page at a time, so that only
+    one page is held in memory
+    """
+    users = User.iterate(cursor, order_by, PAGE_SIZE)
+    yield "["
+    separator = ""
+    while True:
+        page = list(itertools.islice(users, PAGE_SIZE))
+        if len(page) == 0:
+            break
+        yield separator + ",".join(json.dumps(user.to_json())
+                                   for user in page)
+        separator = ","
+    yield "]\n"
 
 
 @app_views.route('/users/<user_id>', methods=['GET'], strict_slashes=False)
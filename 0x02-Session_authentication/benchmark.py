@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+""" Benchmark module
+Timing and synthetic users shared by the main_N.py benchmarks
+"""
+import json
+import time
+from typing import Any, Callable, Iterable, Optional
+
+
+def timed(fn: Callable[[int], Any], repeat: int = 1) -> float:
+    """ Return the average duration of fn(i), for i in range(repeat),
+    in milliseconds
+    """
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def write_users(ids: Iterable[str],
+                created_at: Optional[Callable[[int], str]] = None,
+                **attributes: Any):
+    """ Write one synthetic user per ID to .db_User.json: the i-th is
+    user<i>@hbtn.io, first named Bob, created at created_at(i) or
+    2024-09-05T18:00:06; attributes override the others
+    """
+    with open(".db_User.json", "w") as f:
+        json.dump({obj_id: {"id": obj_id,
+                            "created_at": "2024-09-05T18:00:06"
+                            if created_at is None else created_at(i),
+                            "updated_at": "2024-09-05T18:00:06",
+                            "email": "user{}@hbtn.io".format(i),
+                            "_password": None, "first_name": "Bob",
+                            "last_name": None, **attributes}
+                   for i, obj_id in enumerate(ids)}, f)
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Main 10
+Peak memory of dumping all users as one JSON list, as GET /api/v1/users
+does without parameters, against dumping them one page at a time,
+as it does with ?stream=1
+Usage: ./main_10.py [USERS]
+"""
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+from benchmark import write_users
+from models.base import PAGE_SIZE
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+def peak(fn):
+    """ Return the peak memory allocated by fn, in MB """
+    tracemalloc.start()
+    fn()
+    result = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result / 1024 / 1024
+
+
+def full_dump():
+    """ Build the whole response body at once """
+    return len(json.dumps([user.to_json() for user in User.all()]))
+
+
+def streamed_dump():
+    """ Build the response body one page at a time """
+    length = 0
+    cursor = None
+    while True:
+        users, cursor = User.page(PAGE_SIZE, cursor)
+        length += len(",".join(json.dumps(user.to_json())
+                               for user in users))
+        if cursor is None:
+            return length
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    write_users(map(str, range(size)), _password="0" * 64)
+    User.load_from_file()
+    print("{} users: full list {:.1f} MB peak, {} per page {:.1f} MB "
+          "peak".format(size, peak(full_dump), PAGE_SIZE, peak(streamed_dump)))
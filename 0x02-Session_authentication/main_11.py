@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+""" Main 11
+Time queries with operators through the index-aware planner against
+matching every object, at 100k users
+Usage: ./main_11.py [USERS]
+"""
+import os
+import random
+import sys
+import tempfile
+from datetime import datetime
+from benchmark import timed, write_users
+from models.engine.storage import matches
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REPEAT = 20
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    random.seed(0)
+    write_users(map(str, range(size)),
+                lambda i: "2024-{:02d}-{:02d}T18:00:06".format(
+                    random.randint(1, 12), random.randint(1, 28)))
+    User.load_from_file()
+
+    queries = (
+        ("search email prefix", User.search,
+         {"email": {"prefix": "user1234"}}),
+        ("search created_at range", User.search,
+         {"created_at": {"gte": datetime(2024, 3, 1),
+                         "lt": datetime(2024, 3, 3)}}),
+        ("search email in", User.search,
+         {"email": {"in": ["user1@hbtn.io", "user2@hbtn.io"]}}),
+        ("count created_at range", User.count,
+         {"created_at": {"gte": datetime(2024, 6, 1)}}),
+        ("first created_at range", User.first,
+         {"created_at": {"gte": datetime(2024, 6, 1)},
+          "first_name": "Bob"}),
+    )
+    # Build the sorted indexes before timing
+    for name, fn, query in queries:
+        fn(query)
+    for name, fn, query in queries:
+        planned = timed(lambda i: fn(query), REPEAT)
+        scanned = timed(
+            lambda i: [user for user in User.all() if matches(user, query)],
+            REPEAT)
+        print("{:>24}: planner {:>8.3f} ms, full scan {:>8.1f} ms".format(
+            name, planned, scanned))
@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+""" Main 12
+Time saving one user and loading all of them, at 1M users, with one
+.db_User.json file against shards of it
+Usage: ./main_12.py [USERS] [SHARDS]
+"""
+import os
+import sys
+import tempfile
+from benchmark import timed, write_users
+from models import base
+from models.engine.json_storage import JSONStorage
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+shards = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+SAVES = 5
+
+
+def save_one():
+    """ Change and save one user """
+    user = User.get("0")
+    user.first_name = "Alice" if user.first_name == "Bob" else "Bob"
+    user.save()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    write_users(map(str, range(size)))
+
+    for name, layout in (("single file", 1), ("{} shards".format(shards),
+                                              shards)):
+        # Lazy: the load time is reading the files, not building objects
+        base.storage = JSONStorage('file', True, False, layout)
+        # The first load moves the users to the layout
+        User.load_from_file()
+        load = timed(lambda i: User.load_from_file())
+        save = timed(lambda i: save_one(), SAVES)
+        print("{:>12}: load {:>8.1f} ms, save one user {:>8.1f} ms".format(
+            name, load, save))
+    assert User.count() == size
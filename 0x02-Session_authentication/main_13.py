@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+""" Main 13
+Time a cold start, loading the users then serving a first lookup, at
+1M users, from .db_User.json against its binary snapshot .db_User.bin
+Usage: ./main_13.py [USERS]
+"""
+import os
+import sys
+import tempfile
+import time
+from benchmark import write_users
+from models import base
+from models.engine.binary_snapshot import json_to_binary
+from models.engine.json_storage import JSONStorage
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+
+def cold_start(lazy, file_format):
+    """ Return the duration in milliseconds of a load and a lookup """
+    base.storage = JSONStorage('file', lazy, False, 1, file_format)
+    start = time.perf_counter()
+    User.load_from_file()
+    user = User.search({"email": "user{}@hbtn.io".format(size // 2)})[0]
+    assert user.created_at.year == 2024
+    return (time.perf_counter() - start) * 1000
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    write_users(map(str, range(size)),
+                lambda i: "2024-09-05T18:{:02d}:{:02d}".format(
+                    i // 60 % 60, i % 60))
+    start = time.perf_counter()
+    json_to_binary(".db_User.json", ".db_User.bin")
+    print("conversion: {:.1f} ms, {} bytes of JSON, {} bytes binary".format(
+        (time.perf_counter() - start) * 1000,
+        os.path.getsize(".db_User.json"), os.path.getsize(".db_User.bin")))
+
+    for lazy in (True, False):
+        from_json = cold_start(lazy, 'json')
+        from_binary = cold_start(lazy, 'binary')
+        print("{:>5}: json {:>8.1f} ms, binary {:>8.1f} ms, x{:.1f}".format(
+            "lazy" if lazy else "eager", from_json, from_binary,
+            from_json / from_binary))
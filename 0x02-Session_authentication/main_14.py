@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+""" Main 14
+Check that the journal recovers from a crash in the middle of a write:
+the truncated entry is dropped, and users saved after it are kept
+"""
+import os
+import tempfile
+from models import base
+from models.engine import json_storage
+from models.engine.json_storage import JSONStorage
+from models.user import User
+
+
+def restart():
+    """ Load the users again, as a new process does """
+    json_storage.JOURNALS.clear()
+    base.storage = JSONStorage('journal')
+    User.load_from_file()
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    restart()
+    User(email="a@x").save()
+    with open(".db_User.journal", "rb+") as f:
+        # Crash in the middle of writing the entry of a second user
+        f.seek(0, os.SEEK_END)
+        f.write(b'{"op": "save", "id": "lost", "obj": {"id": "lo')
+
+    restart()
+    User(email="b@x").save()
+    restart()
+    print("After a truncated entry, users: {}".format(
+        sorted(user.email for user in User.all())))
+    assert [user.email for user in User.search({"email": "b@x"})] == ["b@x"]
+    assert User.get("lost") is None
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+""" Main 15
+Check that the email index follows the users: saving one indexes it,
+saving it under a new email moves it, removing it drops it, and
+load_from_file rebuilds the index from the file
+"""
+import os
+import tempfile
+from models import base
+from models.engine.json_storage import INDEX_DATA, JSONStorage
+from models.user import User
+
+
+def indexed(email):
+    """ Return the IDs indexed under an email """
+    return INDEX_DATA["User"]["email"].get(email, set())
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    base.storage = JSONStorage('file')
+    User.load_from_file()
+
+    bob = User(email="bob@hbtn.io")
+    bob.save()
+    print("Indexed on save: {}".format(indexed("bob@hbtn.io") == {bob.id}))
+
+    bob.email = "robert@hbtn.io"
+    bob.save()
+    print("Moved on save: {}".format(
+        indexed("bob@hbtn.io") == set() and
+        indexed("robert@hbtn.io") == {bob.id}))
+    print("Found under the new email only: {}".format(
+        User.search({"email": "bob@hbtn.io"}) == [] and
+        User.search({"email": "robert@hbtn.io"}) == [bob]))
+
+    alice = User(email="alice@hbtn.io")
+    alice.save()
+    bob.remove()
+    print("Dropped on remove: {}".format(
+        indexed("robert@hbtn.io") == set() and
+        User.search({"email": "robert@hbtn.io"}) == []))
+
+    INDEX_DATA.clear()
+    User.load_from_file()
+    print("Rebuilt on load: {}".format(
+        indexed("alice@hbtn.io") == {alice.id} and
+        set().union(*INDEX_DATA["User"]["email"].values()) == {alice.id}))
+    os.chdir("/")
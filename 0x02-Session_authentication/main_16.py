@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+""" Main 16
+Check the "deferred" storage mode: changes are flushed after the
+delay or once enough of them are pending, a failed flush is retried,
+and pending changes are flushed at exit and on SIGTERM, even when it
+comes during the flush at exit. Without STORAGE_MODE=deferred, each
+change is written at once
+"""
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ["STORAGE_MODE"] = "deferred"
+os.environ["STORAGE_FLUSH_INTERVAL_MS"] = "500"
+os.environ["STORAGE_FLUSH_CHANGES"] = "10"
+from models import base  # noqa: E402
+from models.user import User  # noqa: E402
+
+FLUSHED = 0.2
+
+
+def on_disk():
+    """ Return the IDs of the users in .db_User.json """
+    try:
+        with open(".db_User.json") as f:
+            return set(json.load(f))
+    except FileNotFoundError:
+        return set()
+
+
+def run(code, env, send_sigterm=False):
+    """ Run code in a new process, in the current directory, and
+    return its exit status
+    """
+    env = dict(os.environ, **env)
+    env["PYTHONPATH"] = os.pathsep.join(
+        [os.path.dirname(os.path.abspath(__file__)),
+         os.environ.get("PYTHONPATH", "")])
+    process = subprocess.Popen([sys.executable, "-c", code], env=env,
+                               stdout=subprocess.PIPE)
+    if send_sigterm:
+        # Wait for the user to be saved
+        process.stdout.readline()
+        process.send_signal(signal.SIGTERM)
+    return process.wait(timeout=10)
+
+
+SAVE = """
+from models.user import User
+User.load_from_file()
+user = User(email="{0}@hbtn.io")
+user.id = "{0}"
+user.save()
+print("saved", flush=True)
+"""
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    User.load_from_file()
+
+    user = User(email="bob@hbtn.io")
+    user.save()
+    print("Not written at once: {}".format(user.id not in on_disk()))
+    time.sleep(0.5 + FLUSHED)
+    print("Flushed after the delay: {}".format(user.id in on_disk()))
+
+    time.sleep(FLUSHED)
+    users = [User(email="u{}@hbtn.io".format(i)) for i in range(10)]
+    for user in users:
+        user.save()
+    time.sleep(FLUSHED)
+    print("Flushed after 10 changes: {}".format(
+        {user.id for user in users} <= on_disk()))
+
+    # The temporary file cannot be created while a directory has its name
+    os.mkdir(".db_User.json.tmp")
+    user = User(email="retried@hbtn.io")
+    user.save()
+    time.sleep(0.5 + FLUSHED)
+    os.rmdir(".db_User.json.tmp")
+    print("Not written by a failed flush: {}".format(
+        user.id not in on_disk()))
+    time.sleep(0.5 + FLUSHED)
+    print("Written by the next flush: {}".format(user.id in on_disk()))
+
+    status = run(SAVE.format("atexit"),
+                 {"STORAGE_FLUSH_INTERVAL_MS": "60000"})
+    print("Flushed at exit: {}".format(
+        status == 0 and "atexit" in on_disk()))
+
+    status = run(SAVE.format("sigterm") + "import time\ntime.sleep(10)\n",
+                 {"STORAGE_FLUSH_INTERVAL_MS": "60000"}, send_sigterm=True)
+    print("Flushed on SIGTERM: {}".format(
+        status == 128 + signal.SIGTERM and "sigterm" in on_disk()))
+
+    # SIGTERM while the flush at exit writes the users: the flush ends,
+    # the process was exiting already
+    status = run(SAVE.format("both") + """
+import os, signal
+save_to_file = User.save_to_file
+def terminate_then_save():
+    os.kill(os.getpid(), signal.SIGTERM)
+    save_to_file()
+User.save_to_file = terminate_then_save
+""", {"STORAGE_FLUSH_INTERVAL_MS": "60000"})
+    print("SIGTERM during the flush at exit: {}".format(
+        status == 0 and "both" in on_disk()))
+
+    status = run(SAVE.format("synchronous") + """
+import os
+from models import base
+assert base.storage.flusher is None
+# Leave without the flush at exit
+os._exit(0)
+""", {"STORAGE_MODE": "file"})
+    print("Written at once without STORAGE_MODE=deferred: {}".format(
+        status == 0 and "synchronous" in on_disk()))
+    base.storage.flusher.flush()
+    os.chdir("/")
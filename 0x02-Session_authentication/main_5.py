@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+""" Main 5
+Compare the JSON and SQLite storage backends at 10k, 100k and 1M users
+Usage: ./main_5.py [USERS ...]
+"""
+import os
+import sys
+import tempfile
+import uuid
+from benchmark import timed, write_users
+from models.engine.json_storage import JSONStorage
+from models.engine.sqlite_storage import SQLiteStorage
+from models.user import User
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+LOOKUPS = 1000
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    for size in sizes:
+        ids = [str(uuid.uuid4()) for _ in range(size)]
+        write_users(ids, _password="0" * 64, first_name=None)
+        if os.path.exists(".db.sqlite3"):
+            os.remove(".db.sqlite3")
+
+        backends = (("json", JSONStorage()),
+                    ("sqlite", SQLiteStorage(".db.sqlite3")))
+        for name, storage in backends:
+            if name == "json":
+                load = timed(lambda i: storage.load(User))
+            else:
+                load = timed(lambda i: storage.import_json(User))
+            search = timed(lambda i: storage.search(
+                User, {"email": "user{}@hbtn.io".format(i * 7 % size)}),
+                LOOKUPS)
+            get = timed(lambda i: storage.get(User, ids[i * 7 % size]),
+                        LOOKUPS)
+            user = storage.get(User, ids[0])
+            save = timed(lambda i: storage.save(user))
+            print("{:>8} users {:>6}: load/import {:>9.1f} ms, search by "
+                  "email {:.3f} ms, get {:.3f} ms, save {:.1f} ms".format(
+                      size, name, load, search, get, save))
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+""" Main 6
+Compare the startup time of eager and lazy loading, at 10k, 100k and
+1M users, and the cost of the first lookups once loaded lazily
+Usage: ./main_6.py [USERS ...]
+"""
+import os
+import sys
+import tempfile
+import uuid
+from benchmark import timed, write_users
+from models.engine.json_storage import JSONStorage
+from models.user import User
+
+sizes = [int(arg) for arg in sys.argv[1:]] or [10000, 100000, 1000000]
+LOOKUPS = 1000
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    for size in sizes:
+        ids = [str(uuid.uuid4()) for _ in range(size)]
+        write_users(ids, _password="0" * 64, first_name=None)
+
+        for lazy in (False, True):
+            storage = JSONStorage('file', lazy)
+            load = timed(lambda i: storage.load(User))
+            search = timed(lambda i: storage.search(
+                User, {"email": "user{}@hbtn.io".format(i * 7 % size)}),
+                LOOKUPS)
+            get = timed(lambda i: storage.get(User, ids[i * 13 % size]),
+                        LOOKUPS)
+            print("{:>8} users {:>5}: startup {:>9.1f} ms, first search by "
+                  "email {:.3f} ms, first get {:.3f} ms".format(
+                      size, "lazy" if lazy else "eager", load, search, get))
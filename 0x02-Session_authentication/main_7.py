@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+""" Main 7
+Measure the memory used per User object, with the previous layout
+(a __dict__ and two datetime objects) and with __slots__ and epoch
+integer timestamps
+Usage: ./main_7.py [USERS]
+"""
+import sys
+import tracemalloc
+import uuid
+from datetime import datetime
+from models.base import TIMESTAMP_FORMAT
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+
+class DictUser():
+    """ User attributes laid out as before __slots__ """
+
+    def __init__(self, **kwargs):
+        """ Initialize the attributes like the previous Base and User """
+        self.id = kwargs.get('id')
+        self.created_at = datetime.strptime(kwargs.get('created_at'),
+                                            TIMESTAMP_FORMAT)
+        self.updated_at = datetime.strptime(kwargs.get('updated_at'),
+                                            TIMESTAMP_FORMAT)
+        self.email = kwargs.get('email')
+        self._password = kwargs.get('_password')
+        self.first_name = kwargs.get('first_name')
+        self.last_name = kwargs.get('last_name')
+
+
+def bytes_per_object(cls, objs_json):
+    """ Return the memory allocated per object built from objs_json,
+    once their timestamps are read """
+    tracemalloc.start()
+    start = tracemalloc.get_traced_memory()[0]
+    objs = [cls(**obj_json) for obj_json in objs_json]
+    for obj in objs:
+        obj.created_at, obj.updated_at
+    used = tracemalloc.get_traced_memory()[0] - start
+    tracemalloc.stop()
+    # The list holding the objects is not part of their size
+    return (used - sys.getsizeof(objs)) / len(objs)
+
+
+objs_json = [{"id": str(uuid.uuid4()), "created_at": "2024-09-05T18:00:06",
+              "updated_at": "2024-09-05T18:00:06",
+              "email": "user{}@hbtn.io".format(i), "_password": "0" * 64,
+              "first_name": "Bob", "last_name": None}
+             for i in range(size)]
+before = bytes_per_object(DictUser, objs_json)
+after = bytes_per_object(User, objs_json)
+print("{} users: __dict__ and datetime {:.0f} bytes/object, "
+      "__slots__ and epoch int {:.0f} bytes/object ({:.0f}% less)".format(
+          size, before, after, 100 * (1 - after / before)))
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+""" Main 8
+Stress the JSON storage with reader and writer threads, checking that
+searches never fail and always agree with the indexes, then compare
+the read throughput under concurrent writes with and without the
+thread-safe mode, and check the files against the stored objects
+
+Writers add users, which resizes the dicts and shifts the sorted
+index of emails under the readers, rename and remove them, while the
+file is rewritten on each change, or the journal is compacted in the
+background. Threads are switched as often
+as possible so that, without the thread-safe mode, readers see
+half-made changes: a renamed user found under neither email, or a
+prefix search returning users of the shifted index
+Usage: ./main_8.py [USERS] [SECONDS]
+"""
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from models import base, journal
+from models.engine import json_storage
+from models.engine.json_storage import DATA, INDEX_DATA, JSONStorage
+from models.user import User
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 2
+READERS = 4
+WRITERS = 2
+RENAMED = 10
+
+
+def writer(n, stop):
+    """ Create, rename and remove users until stopped """
+    i = 0
+    while not stop.is_set():
+        # Sorted before "user...": each one shifts the readers' range
+        user = User(email="a-w{}-{}@hbtn.io".format(n, i))
+        user.save()
+        renamed = User.get("renamed{}".format((n + i) % RENAMED))
+        if renamed.email.startswith("old"):
+            renamed.email = renamed.email.replace("old", "new")
+        else:
+            renamed.email = renamed.email.replace("new", "old")
+        renamed.save()
+        if i % 2 == 0:
+            user.remove()
+        i += 1
+
+
+def reader(n, stop, reads, errors):
+    """ Search users by email and by prefix until stopped """
+    i = 0
+    while not stop.is_set():
+        try:
+            email = "user{}@hbtn.io".format((n + i * 7) % size)
+            found = User.search({"email": email})
+            assert len(found) == 1 and found[0].email == email, \
+                "{} not found".format(email)
+            k = i % RENAMED
+            found = User.search({"email": {"in": [
+                "old{}@hbtn.io".format(k), "new{}@hbtn.io".format(k)]}})
+            assert len(found) == 1, \
+                "renamed{} found {} times".format(k, len(found))
+            if i % 10 == 0:
+                found = User.search({"email": {"prefix": "user"}})
+                assert len(found) == size and \
+                    all(user.email.startswith("user") for user in found), \
+                    "prefix search out of the sorted index"
+        except Exception as e:
+            errors.append(str(e) or repr(e))
+        i += 1
+    reads[n] = i
+
+
+def on_disk():
+    """ Return the email of each user, as loaded again from the files """
+    json_storage.JOURNALS.clear()
+    base.storage = JSONStorage(base.storage.mode)
+    User.load_from_file()
+    return {user.id: user.email for user in User.all()}
+
+
+def run(mode, thread_safe):
+    """ Run the readers and writers, return the reads per second, the
+    errors, whether the index and whether the files hold exactly the
+    stored objects
+    """
+    users = [User(email="user{}@hbtn.io".format(i)) for i in range(size)]
+    users += [User(id="renamed{}".format(k), email="old{}@hbtn.io".format(k))
+              for k in range(RENAMED)]
+    with open(".db_User.json", "w") as f:
+        json.dump({user.id: user.to_json(True) for user in users}, f)
+    json_storage.JOURNALS.clear()
+    base.storage = JSONStorage(mode, thread_safe=thread_safe)
+    User.load_from_file()
+    stop = threading.Event()
+    reads = [0] * READERS
+    errors = []
+    threads = [threading.Thread(target=writer, args=(n, stop))
+               for n in range(WRITERS)]
+    threads += [threading.Thread(target=reader,
+                                 args=(n, stop, reads, errors))
+                for n in range(READERS)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    if mode == 'journal':
+        base.storage._journal(User).wait()
+    # The index must hold exactly the stored objects
+    indexed = set().union(*INDEX_DATA["User"]["email"].values())
+    consistent = indexed == set(DATA["User"])
+    stored = {user.id: user.email for user in DATA["User"].values()}
+    try:
+        saved = on_disk() == stored
+    except ValueError:
+        # Writes overlapping in the file
+        saved = False
+    return sum(reads) / seconds, errors, consistent, saved
+
+
+# Compact the journal every few hundred changes
+journal.COMPACT_THRESHOLD = 64 * 1024
+sys.setswitchinterval(1e-6)
+for mode in ('journal', 'file'):
+    for thread_safe in (False, True):
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            rate, errors, consistent, saved = run(mode, thread_safe)
+            os.chdir("/")
+        print("{:>7} {:>11}: {:>9.0f} reads/s with {} writers, {} errors, "
+              "index {}, file {}".format(
+                  mode, "thread-safe" if thread_safe else "unlocked",
+                  rate, WRITERS, len(errors),
+                  "consistent" if consistent else "INCONSISTENT",
+                  "up to date" if saved else "STALE"))
+        for error in sorted(set(errors))[:3]:
+            print("    {}".format(error))
+        if thread_safe:
+            assert len(errors) == 0 and consistent and saved
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+""" Main 9
+Per-request cost of picking up the sessions written by other workers,
+at 100k sessions: a full load_from_file, as SessionDBAuth used to do,
+against reload when nothing changed and when another worker created
+a session, in the "journal" storage mode
+Usage: ./main_9.py [SESSIONS]
+"""
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from models import base
+from models.engine.json_storage import JSONStorage
+from models.journal import Journal
+from models.user_session import UserSession
+
+size = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+REQUESTS = 200
+
+
+def per_request(fn, repeat):
+    """ Return the average duration of fn in milliseconds """
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) * 1000 / repeat
+
+
+def lookup(i):
+    """ Look a session up like SessionDBAuth.user_id_for_session_id """
+    return UserSession.search({"session_id": "session{}".format(i % size)})
+
+
+def other_worker_write(i):
+    """ Append a new session to the journal, as another worker does """
+    session = UserSession(user_id="user", session_id="new{}".format(i))
+    other_journal.append("save", session.id, session.to_json(True))
+
+
+def full_load(i):
+    """ Reparse the whole file """
+    UserSession.load_from_file()
+    lookup(i)
+
+
+def reload(i):
+    """ Apply the changes since the last reload """
+    UserSession.reload()
+    lookup(i)
+
+
+def write_then_reload(i):
+    """ Apply the session just created by another worker """
+    other_worker_write(i)
+    reload(i)
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    os.chdir(tmp)
+    with open(".db_UserSession.json", "w") as f:
+        json.dump({obj_id: {"id": obj_id, "created_at": "2024-09-05T18:00:06",
+                            "updated_at": "2024-09-05T18:00:06",
+                            "user_id": str(uuid.uuid4()),
+                            "session_id": "session{}".format(i)}
+                   for i, obj_id in enumerate(str(uuid.uuid4())
+                                              for _ in range(size))}, f)
+    base.storage = JSONStorage('journal')
+    other_journal = Journal("UserSession")
+    UserSession.load_from_file()
+
+    print("{} sessions, per request:".format(size))
+    print("  load_from_file + search:        {:>9.3f} ms".format(
+        per_request(full_load, 5)))
+    print("  reload + search, no change:     {:>9.3f} ms".format(
+        per_request(reload, REQUESTS)))
+    print("  reload + search, 1 new session: {:>9.3f} ms".format(
+        per_request(write_then_reload, REQUESTS)))
+    print("  (writing the new session alone: {:>9.3f} ms)".format(
+        per_request(other_worker_write, REQUESTS)))
+    assert UserSession.count() == size + REQUESTS
@@ -1,37 +1,110 @@
 #!/usr/bin/env python3
 """ Base module
 """
-from datetime import datetime
-from typing import TypeVar, List, Iterable
-from os import path
-import json
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, TypeVar, List, Iterable, Iterator, \
+    Optional, Tuple
+from os import getenv
+import calendar
+import itertools
+import time
 import uuid
+from models.engine.json_storage import DATA, JSONStorage  # noqa: F401
+from models.engine.storage import ORDERS, TIMESTAMP_FORMAT
 
 
-TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
-DATA = {}
+EPOCH = datetime(1970, 1, 1)
+# Number of objects fetched at a time by Base.iterate
+PAGE_SIZE = 1000
+
+# Choose the storage backend based on the
+# STORAGE_BACKEND environment variable
+STORAGE_BACKEND = getenv('STORAGE_BACKEND', 'json')
+if STORAGE_BACKEND == 'sqlite':
+    from models.engine.sqlite_storage import SQLiteStorage
+    storage = SQLiteStorage()
+else:
+    storage = JSONStorage()
+
+
+class Timestamp():
+    """ Datetime attribute stored as an epoch integer, in seconds, in the
+    slot of the same name prefixed with "_"
+    A string in TIMESTAMP_FORMAT, as read from a file, is kept until
+    the first read so that loading many objects does not pay for parsing
+    """
+
+    def __set_name__(self, owner: type, name: str):
+        """ Store the value in the "_<name>" slot
+        """
+        self.name = name
+        self.slot = "_{}".format(name)
+
+    def epoch(self, obj: TypeVar('Base')) -> int:
+        """ Return the epoch integer, parsing the string if needed
+        """
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            value = calendar.timegm(time.strptime(value, TIMESTAMP_FORMAT))
+            setattr(obj, self.slot, value)
+        return value
+
+    def to_string(self, obj: TypeVar('Base')) -> str:
+        """ Return the value in TIMESTAMP_FORMAT
+        """
+        value = getattr(obj, self.slot)
+        if type(value) is str:
+            return value
+        return time.strftime(TIMESTAMP_FORMAT, time.gmtime(value))
+
+    def __get__(self, obj: TypeVar('Base'), objtype: type = None):
+        """ Return the value as a naive UTC datetime
+        """
+        if obj is None:
+            return self
+        return EPOCH + timedelta(seconds=self.epoch(obj))
+
+    def __set__(self, obj: TypeVar('Base'), value: datetime):
+        """ Set the value from a naive UTC datetime, or its string
+        in TIMESTAMP_FORMAT
+        """
+        if type(value) is not str:
+            value = calendar.timegm(value.utctimetuple())
+        setattr(obj, self.slot, value)
 
 
 class Base():
     """ Base class
+
+    Attributes are kept in __slots__ rather than in a __dict__: a
+    subclass lists its own attributes in __slots__ to stay compact,
+    otherwise its instances get a __dict__ for them
     """
 
+    __slots__ = ('id', '_created_at', '_updated_at')
+
+    # Attributes with a secondary index, used by search
+    INDEXES = ()
+    # Attributes with a sorted index, used by range and prefix queries
+    SORTED_INDEXES = ('created_at', 'updated_at')
+
+    created_at = Timestamp()
+    updated_at = Timestamp()
+
     def __init__(self, *args: list, **kwargs: dict):
         """ Initialize a Base instance
         """
-        s_class = str(self.__class__.__name__)
-        if DATA.get(s_class) is None:
-            DATA[s_class] = {}
-
-        self.id = kwargs.get('id', str(uuid.uuid4()))
+        # Not kwargs.get('id', default): objects read from a file would
+        # each pay for a uuid4 they do not use
+        self.id = kwargs['id'] if 'id' in kwargs else str(uuid.uuid4())
+        # Timestamps read from a file are parsed on first access
         if kwargs.get('created_at') is not None:
-            self.created_at = datetime.strptime(kwargs.get('created_at'),
-                                                TIMESTAMP_FORMAT)
+            self.created_at = kwargs.get('created_at')
         else:
             self.created_at = datetime.utcnow()
         if kwargs.get('updated_at') is not None:
-            self.updated_at = datetime.strptime(kwargs.get('updated_at'),
-                                                TIMESTAMP_FORMAT)
+            self.updated_at = kwargs.get('updated_at')
         else:
             self.updated_at = datetime.utcnow()
 
@@ -44,13 +117,68 @@ class Base():
             return False
         return (self.id == other.id)
 
+    @classmethod
+    def fields(cls) -> Tuple[str]:
+        """ Return the names of the attributes kept in __slots__
+        """
+        names = cls.__dict__.get('_field_names')
+        if names is None:
+            names = ('id', 'created_at', 'updated_at')
+            for klass in reversed(cls.__mro__):
+                if klass is not Base:
+                    names += tuple(klass.__dict__.get('__slots__', ()))
+            # Cached on each class, not inherited by its subclasses
+            setattr(cls, '_field_names', names)
+        return names
+
+    @classmethod
+    def from_columns(cls, columns: Dict[str, List[Any]],
+                     size: int) -> List[TypeVar('Base')]:
+        """ Build size objects from the values of their attributes, a
+        column at a time, as __init__ would from their JSON: missing
+        attributes are None, missing IDs and timestamps new ones
+        Subclasses whose __init__ does more than set their attributes
+        override it; instances with a __dict__ are built by __init__
+        """
+        if cls.__dictoffset__ != 0:
+            names = list(columns)
+            return [cls(**{name: value for name, value in zip(names, row)
+                           if value is not None})
+                    for row in zip(*columns.values())]
+        objs = list(map(cls.__new__, itertools.repeat(cls, size)))
+        now = calendar.timegm(datetime.utcnow().utctimetuple())
+        for name in cls.fields():
+            values = columns.get(name, itertools.repeat(None, size))
+            descriptor = getattr(cls, name, None)
+            if name == 'id':
+                values = [str(uuid.uuid4()) if value is None else value
+                          for value in values]
+            elif isinstance(descriptor, Timestamp):
+                # Strings are parsed on first access, as in __set__
+                values = [now if value is None else value
+                          for value in values]
+                name = descriptor.slot
+            # setattr is called from C, with no Python loop
+            deque(map(setattr, objs, itertools.repeat(name), values), 0)
+        return objs
+
     def to_json(self, for_serialization: bool = False) -> dict:
         """ Convert the object a JSON dictionary
         """
         result = {}
-        for key, value in self.__dict__.items():
+        keys = list(self.fields()) + list(getattr(self, '__dict__', {}))
+        for key in keys:
             if not for_serialization and key[0] == '_':
                 continue
+            descriptor = getattr(type(self), key, None)
+            if isinstance(descriptor, Timestamp):
+                result[key] = descriptor.to_string(self)
+                continue
+            try:
+                value = getattr(self, key)
+            except AttributeError:
+                # Slot never set
+                continue
             if type(value) is datetime:
                 result[key] = value.strftime(TIMESTAMP_FORMAT)
             else:
@@ -61,52 +189,36 @@ class Base():
     def load_from_file(cls):
         """ Load all objects from file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        DATA[s_class] = {}
-        if not path.exists(file_path):
-            return
+        storage.load(cls)
 
-        with open(file_path, 'r') as f:
-            objs_json = json.load(f)
-            for obj_id, obj_json in objs_json.items():
-                DATA[s_class][obj_id] = cls(**obj_json)
+    @classmethod
+    def reload(cls):
+        """ Apply the changes made by other processes since the load
+        """
+        storage.reload(cls)
 
     @classmethod
     def save_to_file(cls):
         """ Save all objects to file
         """
-        s_class = cls.__name__
-        file_path = ".db_{}.json".format(s_class)
-        objs_json = {}
-        for obj_id, obj in DATA[s_class].items():
-            objs_json[obj_id] = obj.to_json(True)
-
-        with open(file_path, 'w') as f:
-            json.dump(objs_json, f)
+        storage.save_all(cls)
 
     def save(self):
         """ Save current object
         """
-        s_class = self.__class__.__name__
         self.updated_at = datetime.utcnow()
-        DATA[s_class][self.id] = self
-        self.__class__.save_to_file()
+        storage.save(self)
 
     def remove(self):
         """ Remove object
         """
-        s_class = self.__class__.__name__
-        if DATA[s_class].get(self.id) is not None:
-            del DATA[s_class][self.id]
-            self.__class__.save_to_file()
+        storage.remove(self)
 
     @classmethod
-    def count(cls) -> int:
-        """ Count all objects
+    def count(cls, query: dict = None) -> int:
+        """ Count the objects meeting a query, or all objects
         """
-        s_class = cls.__name__
-        return len(DATA[s_class].keys())
+        return storage.count(cls, query)
 
     @classmethod
     def all(cls) -> Iterable[TypeVar('Base')]:
@@ -118,22 +230,45 @@ class Base():
     def get(cls, id: str) -> TypeVar('Base'):
         """ Return one object by ID
         """
-        s_class = cls.__name__
-        return DATA[s_class].get(id)
+        return storage.get(cls, id)
 
     @classmethod
     def search(cls, attributes: dict = {}) -> List[TypeVar('Base')]:
         """ Search all objects with matching attributes
+        An attribute can be given a dict of operators instead of a
+        value: eq, in, prefix, gt, gte, lt and lte, for example
+        {"email": {"prefix": "bob@"}, "created_at": {"gte": since}}
         """
-        s_class = cls.__name__
+        return storage.search(cls, attributes)
 
-        def _search(obj):
-            """"""
-            if len(attributes) == 0:
-                return True
-            for k, v in attributes.items():
-                if (getattr(obj, k) != v):
-                    return False
-            return True
+    @classmethod
+    def first(cls, query: dict = {}) -> TypeVar('Base'):
+        """ Return one object meeting a query, or None
+        """
+        return storage.first(cls, query)
 
-        return list(filter(_search, DATA[s_class].values()))
+    @classmethod
+    def page(cls, limit: int = None, cursor: str = None,
+             order_by: str = 'id') -> Tuple[List[TypeVar('Base')],
+                                            Optional[str]]:
+        """ Return up to limit objects sorted by order_by, "id" or
+        "created_at", starting after the cursor, and the cursor of the
+        next page, or None if there is none
+        """
+        if order_by not in ORDERS:
+            raise ValueError("order_by must be one of {}".format(ORDERS))
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+        return storage.page(cls, limit, cursor, order_by)
+
+    @classmethod
+    def iterate(cls, cursor: str = None, order_by: str = 'id',
+                page_size: int = PAGE_SIZE) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects sorted by order_by, starting after the
+        cursor, fetching page_size objects at a time
+        """
+        while True:
+            objs, cursor = cls.page(page_size, cursor, order_by)
+            yield from objs
+            if cursor is None:
+                return
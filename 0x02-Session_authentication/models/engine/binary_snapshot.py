@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+""" Binary snapshot module
+Binary format of the .db_<Class>.json files, read through mmap
+
+A snapshot holds fixed-schema records of int64 fields, one per
+object: the ID, then one field per attribute. Strings are stored
+once in a string table and referenced by index, and timestamps as
+epoch seconds, so that loading parses no JSON and no dates. Fields
+are decoded when a record or a column is first used
+
+The string table is laid out a column at a time: the IDs first, then
+the new strings of each attribute, so that the strings of a column
+can be decoded in one go
+
+Layout, in native byte order:
+    MAGIC, then the header: record count, field count, string count,
+    length of the schema
+    schema: JSON list of [attribute, type], padded to 8 bytes
+    string offsets: string count + 1 int64
+    records: record count * (field count + 1) int64
+    string data: the UTF-8 strings, end to end
+"""
+import calendar
+import functools
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from collections.abc import MutableMapping
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+from models.engine.storage import TIMESTAMP_FORMAT
+
+
+MAGIC = b"HBDBSNP" + (b"L" if sys.byteorder == 'little' else b"B")
+HEADER = struct.Struct("=4q")
+# Field values of a string, or JSON, field that is None or missing
+NULL = -1
+MISSING = -2
+# Field values of a timestamp field that is None or missing
+NULL_TIME = -2 ** 63
+MISSING_TIME = -2 ** 63 + 1
+# Decoded value of a missing field
+_MISSING = object()
+
+
+def _epoch(value: Any) -> int:
+    """ Return the epoch seconds of a string in TIMESTAMP_FORMAT
+    Raise ValueError for anything else
+    """
+    if type(value) is not str or len(value) != 19 or value[10] != 'T':
+        raise ValueError("Not a timestamp")
+    return calendar.timegm(datetime.fromisoformat(value).utctimetuple())
+
+
+def _field_type(values: List[Any]) -> str:
+    """ Return how to store the values of an attribute: "time" if all
+    of them are timestamps, "str" if all are strings, "json" otherwise
+    """
+    present = [value for value in values if value is not None]
+    if all(type(value) is str for value in present):
+        try:
+            for value in present:
+                _epoch(value)
+            return "time" if len(present) > 0 else "str"
+        except ValueError:
+            return "str"
+    return "json"
+
+
+def write_binary(file_path: str, objs_json: Dict[str, dict]):
+    """ Atomically replace a binary snapshot with the JSON of objects
+    """
+    keys = []
+    for obj_json in objs_json.values():
+        for key in obj_json:
+            if key not in keys:
+                keys.append(key)
+    schema = [[key, _field_type([obj_json.get(key)
+                                 for obj_json in objs_json.values()])]
+              for key in keys]
+    width = len(schema) + 1
+    records = array('q', bytes(8 * width * len(objs_json)))
+    strings = {}
+    for row, obj_id in enumerate(objs_json):
+        records[row * width] = strings.setdefault(obj_id, len(strings))
+    for field, (key, field_type) in enumerate(schema, 1):
+        epochs = {}
+        for row, obj_json in enumerate(objs_json.values()):
+            if key not in obj_json:
+                value = MISSING_TIME if field_type == "time" else MISSING
+            elif obj_json[key] is None:
+                value = NULL_TIME if field_type == "time" else NULL
+            elif field_type == "time":
+                value = epochs.get(obj_json[key])
+                if value is None:
+                    value = epochs[obj_json[key]] = _epoch(obj_json[key])
+            elif field_type == "json":
+                value = strings.setdefault(json.dumps(obj_json[key]),
+                                           len(strings))
+            else:
+                value = strings.setdefault(obj_json[key], len(strings))
+            records[row * width + field] = value
+    data = [string.encode('utf-8') for string in strings]
+    offsets = array('q', [0])
+    for encoded in data:
+        offsets.append(offsets[-1] + len(encoded))
+    schema_bytes = json.dumps(schema).encode('utf-8')
+    schema_bytes += b" " * (-len(schema_bytes) % 8)
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(HEADER.pack(len(objs_json), len(schema), len(data),
+                            len(schema_bytes)))
+        f.write(schema_bytes)
+        f.write(offsets.tobytes())
+        f.write(records.tobytes())
+        f.write(b"".join(data))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class Snapshot():
+    """ Binary snapshot mapped in memory, decoded on demand
+    """
+
+    def __init__(self, file_path: str):
+        """ Map a binary snapshot file
+        Raise ValueError if it is not one, or was written on a machine
+        of another byte order
+        """
+        with open(file_path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            raise ValueError("{} is not a binary snapshot of this "
+                             "machine".format(file_path))
+        start = len(MAGIC)
+        size, n_fields, n_strings, schema_size = HEADER.unpack_from(
+            self._map, start)
+        start += HEADER.size
+        self.schema = [tuple(field) for field in json.loads(
+            self._map[start:start + schema_size])]
+        start += schema_size
+        view = memoryview(self._map)
+        self._offsets = view[start:start + (n_strings + 1) * 8].cast('q')
+        start += (n_strings + 1) * 8
+        self._width = n_fields + 1
+        self._records = view[start:start + size * self._width * 8].cast('q')
+        start += size * self._width * 8
+        self._data = view[start:]
+        self._size = size
+
+    def __len__(self) -> int:
+        """ Return the number of records
+        """
+        return self._size
+
+    def _string(self, index: int) -> str:
+        """ Return a string of the string table
+        """
+        return str(self._data[self._offsets[index]:
+                              self._offsets[index + 1]], 'utf-8')
+
+    def _strings(self, low: int, high: int) -> List[str]:
+        """ Return the strings from low to high, excluded, of the
+        string table, decoded together
+        """
+        offsets = self._offsets[low:high + 1].tolist()
+        start = offsets[0]
+        region = self._data[start:offsets[-1]]
+        text = str(region, 'utf-8')
+        if len(text) != len(region):
+            # Not ASCII: offsets in bytes are not offsets in the text
+            return [str(region[begin - start:end - start], 'utf-8')
+                    for begin, end in zip(offsets, offsets[1:])]
+        return [text[begin - start:end - start]
+                for begin, end in zip(offsets, offsets[1:])]
+
+    def _decode(self, field_type: str, value: int) -> Any:
+        """ Return the JSON value of a field
+        Missing fields are decoded as _MISSING
+        """
+        if field_type == "time":
+            if value == NULL_TIME:
+                return None
+            if value == MISSING_TIME:
+                return _MISSING
+            return time.strftime(TIMESTAMP_FORMAT, time.gmtime(value))
+        if value == NULL:
+            return None
+        if value == MISSING:
+            return _MISSING
+        if field_type == "json":
+            return json.loads(self._string(value))
+        return self._string(value)
+
+    def keys(self) -> List[str]:
+        """ Return the IDs of the records, in order
+        """
+        # Written first, the IDs are the start of the string table
+        return self._strings(0, self._size)
+
+    def record(self, row: int) -> dict:
+        """ Return the JSON of the object of a record
+        """
+        start = row * self._width + 1
+        values = self._records[start:start + self._width - 1].tolist()
+        obj_json = {}
+        for (key, field_type), value in zip(self.schema, values):
+            value = self._decode(field_type, value)
+            if value is not _MISSING:
+                obj_json[key] = value
+        return obj_json
+
+    def _column(self, field: int) -> List[Any]:
+        """ Return the decoded values of a field in every record
+        """
+        field_type = self.schema[field - 1][1]
+        values = self._records[field::self._width].tolist()
+        indexes = [value for value in values if value >= 0]
+        if field_type == "str" and len(indexes) > 0:
+            low, high = min(indexes), max(indexes) + 1
+            if high - low <= 2 * len(indexes):
+                # The strings of the column, and few others
+                strings = self._strings(low, high)
+                return [strings[value - low] if value >= 0
+                        else None if value == NULL else _MISSING
+                        for value in values]
+        # Values repeat, in the other fields: decode each once
+        decoded = {}
+        column = []
+        for value in values:
+            if value not in decoded:
+                decoded[value] = self._decode(field_type, value)
+            column.append(decoded[value])
+        return column
+
+    def column(self, key: str) -> List[Any]:
+        """ Return the values of an attribute in every record, None
+        where it is missing
+        """
+        for field, (name, field_type) in enumerate(self.schema, 1):
+            if name == key:
+                return [None if value is _MISSING else value
+                        for value in self._column(field)]
+        return [None] * self._size
+
+    def rows(self) -> Iterator[Tuple[str, dict]]:
+        """ Yield the ID and the JSON of the object of each record,
+        decoding a column at a time
+        """
+        names = [name for name, field_type in self.schema]
+        columns = [self._column(field) for field in range(1, self._width)]
+        if not any(_MISSING in column for column in columns):
+            # Every record has every attribute: build them all in C
+            yield from zip(self.keys(), map(
+                dict, map(functools.partial(zip, names), zip(*columns))))
+            return
+        for obj_id, values in zip(self.keys(), zip(*columns)):
+            yield obj_id, {name: value for name, value
+                           in zip(names, values) if value is not _MISSING}
+
+
+class Records(MutableMapping):
+    """ JSON of the objects of a snapshot by ID, each decoded when
+    accessed; changes are kept beside the snapshot
+    Stands in for the dict of RAW_DATA in lazy mode
+    """
+
+    def __init__(self, snapshot: Snapshot):
+        """ Initialize the records of a snapshot
+        """
+        self.snapshot = snapshot
+        # Row of each record not replaced or removed since
+        self._rows = {obj_id: row
+                      for row, obj_id in enumerate(snapshot.keys())}
+        self._changed = {}
+
+    def __getitem__(self, obj_id: str) -> dict:
+        """ Return the JSON of an object
+        """
+        if obj_id in self._changed:
+            return self._changed[obj_id]
+        return self.snapshot.record(self._rows[obj_id])
+
+    def __setitem__(self, obj_id: str, obj_json: dict):
+        """ Replace the JSON of an object
+        """
+        self._rows.pop(obj_id, None)
+        self._changed[obj_id] = obj_json
+
+    def __delitem__(self, obj_id: str):
+        """ Remove an object
+        """
+        if obj_id in self._changed:
+            del self._changed[obj_id]
+        else:
+            del self._rows[obj_id]
+
+    def __contains__(self, obj_id: Any) -> bool:
+        """ Tell whether there is an object with this ID, without
+        decoding it
+        """
+        return obj_id in self._rows or obj_id in self._changed
+
+    def __iter__(self) -> Iterator[str]:
+        """ Iterate over the IDs
+        """
+        yield from list(self._rows)
+        yield from list(self._changed)
+
+    def __len__(self) -> int:
+        """ Return the number of objects
+        """
+        return len(self._rows) + len(self._changed)
+
+    def items(self) -> Iterator[Tuple[str, dict]]:
+        """ Yield each ID with the JSON of its object, decoding the
+        snapshot a column at a time rather than a record at a time
+        """
+        if len(self._rows) == len(self.snapshot):
+            # No record was replaced or removed
+            yield from self.snapshot.rows()
+        else:
+            for obj_id, obj_json in self.snapshot.rows():
+                if obj_id in self._rows:
+                    yield obj_id, obj_json
+        yield from list(self._changed.items())
+
+    def objects(self, cls: type) -> Iterator[Tuple[str, Any]]:
+        """ Yield each ID with its object, building those of the
+        snapshot from its columns, without the JSON of each, see
+        Base.from_columns
+        """
+        snapshot = self.snapshot
+        objs = cls.from_columns(
+            {name: snapshot.column(name) for name, _ in snapshot.schema},
+            len(snapshot))
+        if len(self._rows) == len(snapshot):
+            # No record was replaced or removed
+            yield from zip(snapshot.keys(), objs)
+        else:
+            for obj_id, obj in zip(snapshot.keys(), objs):
+                if obj_id in self._rows:
+                    yield obj_id, obj
+        for obj_id, obj_json in list(self._changed.items()):
+            yield obj_id, cls(**obj_json)
+
+    def clear(self):
+        """ Remove all objects, without decoding them
+        """
+        self._rows.clear()
+        self._changed.clear()
+
+    def values_of(self, attrs: Tuple[str]) -> Iterator[Tuple[str, dict]]:
+        """ Yield each ID with the values of some attributes, decoding
+        only those columns
+        """
+        columns = [(attr, self.snapshot.column(attr)) for attr in attrs]
+        for obj_id, row in self._rows.items():
+            values = {}
+            for attr, column in columns:
+                values[attr] = column[row]
+            yield obj_id, values
+        for obj_id, obj_json in self._changed.items():
+            yield obj_id, {attr: obj_json.get(attr) for attr in attrs}
+
+
+def read_binary(file_path: str) -> Dict[str, dict]:
+    """ Return the JSON of all objects of a binary snapshot
+    """
+    return dict(Snapshot(file_path).rows())
+
+
+def json_to_binary(json_path: str, binary_path: str):
+    """ Convert a .db_<Class>.json file to a binary snapshot
+    """
+    with open(json_path, 'r') as f:
+        write_binary(binary_path, json.load(f))
+
+
+def binary_to_json(binary_path: str, json_path: str):
+    """ Convert a binary snapshot to a .db_<Class>.json file
+    """
+    objs_json = read_binary(binary_path)
+    with open(json_path, 'w') as f:
+        json.dump(objs_json, f)
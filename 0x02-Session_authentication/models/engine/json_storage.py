@@ -0,0 +1,884 @@
+#!/usr/bin/env python3
+""" JSON storage module
+Default backend: objects live in DATA and in .db_<Class>.json files,
+in shards of them, or in .db_<Class>.bin binary snapshots
+"""
+from os import getenv, path
+from datetime import datetime
+from typing import Any, Iterator, TypeVar, List, Optional, Tuple
+import contextlib
+import functools
+import heapq
+import itertools
+import json
+import os
+import threading
+from models.engine.binary_snapshot import Records, Snapshot, read_binary, \
+    write_binary
+from models.engine.shards import read_shards, remove_shards, shard_files, \
+    shard_of, shards_version, write_shard, write_shards
+from models.engine.sorted_index import SortedIndex
+from models.engine.storage import Storage, matches, object_sort_key, \
+    sort_key, parse_cursor, make_cursor, index_value, \
+    attribute_index_value, is_operator, RANGE_OPERATORS, _parse_timestamp
+from models.flusher import Flusher
+from models.journal import Journal, write_snapshot
+from models.rwlock import NoLock, RWLock
+
+
+# "file" rewrites .db_<Class>.json on every change, "journal" appends
+# each change to .db_<Class>.journal and compacts it in the background,
+# "deferred" rewrites the files of changed classes in the background
+STORAGE_MODE = getenv('STORAGE_MODE', 'file')
+# When set to 1, objects are only built from their JSON on first use
+STORAGE_LAZY_LOAD = getenv('STORAGE_LAZY_LOAD', '0') == '1'
+# When set to 1, each class is guarded by a reader-writer lock so that
+# request threads can search while others save and remove
+STORAGE_THREAD_SAFE = getenv('STORAGE_THREAD_SAFE', '0') == '1'
+# Above 1, the objects of each class are spread over this number of
+# .db_<Class>.shard<N>.json files, and a change only rewrites one
+STORAGE_SHARDS = int(getenv('STORAGE_SHARDS', 1))
+# "json" keeps each class in .db_<Class>.json, "binary" in a
+# .db_<Class>.bin snapshot, loaded without parsing, see binary_snapshot
+STORAGE_FORMAT = getenv('STORAGE_FORMAT', 'json')
+
+DATA = {}
+# JSON of the objects not built yet, in lazy mode: RAW_DATA[s_class][obj_id]
+RAW_DATA = {}
+# Secondary indexes: INDEX_DATA[s_class][attribute][value] = {obj_id, ...}
+INDEX_DATA = {}
+# Sorted indexes, built on first use by a query:
+# SORTED_DATA[s_class][attribute] = SortedIndex, or None if its values
+# cannot be sorted together
+SORTED_DATA = {}
+# Values each object is indexed under: INDEXED_VALUES[s_class][obj_id]
+INDEXED_VALUES = {}
+# Journals of the classes, in the "journal" storage mode
+JOURNALS = {}
+# IDs of the objects in each shard, with shards: SHARD_IDS[s_class][shard]
+SHARD_IDS = {}
+NO_LOCK = NoLock()
+
+
+def _bound(value: Any, inclusive: bool, upper: bool) -> Tuple[Any, bool]:
+    """ Return the index value bounding a range, and whether it is
+    inclusive: stored timestamps have no microseconds, so one with
+    microseconds is rounded down to the bound it is equivalent to
+    """
+    if isinstance(value, datetime) and value.microsecond != 0:
+        # x >= 10.5 and x > 10.5 mean x > 10, x <= 10.5 and x < 10.5
+        # mean x <= 10
+        return index_value(value.replace(microsecond=0)), upper
+    return index_value(value), inclusive
+
+
+def _bounds(condition: dict) -> Tuple[Any, Any, bool, bool]:
+    """ Return the low and high bounds of a range condition, None if
+    unbounded, and whether each is inclusive
+    Raise ValueError if two bounds on one side disagree
+    """
+    low = high = None
+    include_low = include_high = True
+    for op, arg in condition.items():
+        if op in ('gt', 'gte', 'eq'):
+            if low is not None:
+                raise ValueError("Several lower bounds")
+            low, include_low = _bound(arg, op != 'gt', False)
+        if op in ('lt', 'lte', 'eq'):
+            if high is not None:
+                raise ValueError("Several upper bounds")
+            high, include_high = _bound(arg, op != 'lt', True)
+    return low, high, include_low, include_high
+
+
+def _timestamp_condition(condition: dict) -> Optional[dict]:
+    """ Return a condition on a timestamp with its string operands
+    parsed, as matching does, or None if no timestamp can meet it:
+    one with a prefix, or an operand that is not a timestamp
+    """
+    parsed = {}
+    for op, arg in condition.items():
+        if op == 'prefix':
+            return None
+        try:
+            if op == 'in':
+                items = []
+                for item in arg:
+                    try:
+                        items.append(_parse_timestamp(item)
+                                     if isinstance(item, str) else item)
+                    except ValueError:
+                        # Never equal, as in matching
+                        continue
+                parsed[op] = items
+            else:
+                parsed[op] = _parse_timestamp(arg) \
+                    if isinstance(arg, str) else arg
+        except ValueError:
+            return None
+    return parsed
+
+
+def file_version(file_path: str) -> Optional[tuple]:
+    """ Return a marker that changes whenever a file is rewritten,
+    or None if it does not exist
+    """
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class JSONStorage(Storage):
+    """ Storage keeping every object in memory, in DATA, and in
+    one JSON file per class, with secondary indexes on the
+    attributes listed in the INDEXES of each class
+    """
+
+    def __init__(self, mode: str = STORAGE_MODE,
+                 lazy: bool = STORAGE_LAZY_LOAD,
+                 thread_safe: bool = STORAGE_THREAD_SAFE,
+                 shards: int = STORAGE_SHARDS,
+                 file_format: str = STORAGE_FORMAT):
+        """ Initialize the storage in a STORAGE_MODE, loading
+        objects lazily or not, locking them or not, in one file
+        per class or in shards, of a STORAGE_FORMAT
+        """
+        if file_format == 'binary' and shards > 1:
+            raise ValueError("Binary snapshots cannot be sharded")
+        self.mode = mode
+        self.lazy = lazy
+        self.shards = shards
+        self.file_format = file_format
+        # Reader-writer lock of each class, in thread-safe mode
+        self._locks = {} if thread_safe else None
+        # Mutex serializing the file writes of each class, in thread-safe
+        # mode: held from copying the objects to writing them, so that
+        # writes never overlap and an older copy never replaces a newer
+        self._write_locks = {} if thread_safe else None
+        # Version of the file of each class when last read or written
+        self._versions = {}
+        # Background writer, in the "deferred" storage mode, created
+        # now: its SIGTERM handler can only be set on the main thread,
+        # and the first save may come from a request thread
+        self.flusher = Flusher() if mode == 'deferred' else None
+        # Changes not flushed yet, in the "deferred" storage mode:
+        # _pending[s_class][obj_id] = object saved, or None if removed
+        self._pending = {}
+
+    def _lock(self, cls: type) -> RWLock:
+        """ Return the lock guarding the objects of a class
+        """
+        if self._locks is None:
+            return NO_LOCK
+        lock = self._locks.get(cls.__name__)
+        if lock is None:
+            lock = self._locks.setdefault(cls.__name__, RWLock())
+        return lock
+
+    def _write_lock(self, cls: type):
+        """ Return the mutex serializing the file writes of a class
+        """
+        if self._write_locks is None:
+            return contextlib.nullcontext()
+        return self._write_locks.setdefault(cls.__name__, threading.Lock())
+
+    def load(self, cls: type):
+        """ Load all objects of a class from its file
+        In lazy mode only their JSON is kept, see _build; in the
+        "deferred" mode, changes not flushed yet are kept over the file
+        """
+        with self._lock(cls).write():
+            rewrite = self._load(cls)
+        if rewrite:
+            self._rewrite(cls)
+
+    def _load(self, cls: type) -> bool:
+        """ Load all objects of a class, with the lock held
+        Return whether the files must be written again, see _rewrite
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        binary_path = ".db_{}.bin".format(s_class)
+        # Taken before reading: a write made meanwhile changes it again
+        self._versions[s_class] = self._version(cls)
+        DATA[s_class] = {}
+        raw = RAW_DATA[s_class] = {}
+        # The files are written again when the layout or format changed
+        rewrite = False
+        if self.shards > 1 or shard_files(s_class):
+            objs_json, rewrite = read_shards(s_class, self.shards,
+                                             file_path)
+            raw.update(objs_json)
+            rewrite = rewrite or self.shards == 1
+        elif self.file_format == 'binary' and path.exists(binary_path):
+            # Records are decoded from the mapped file when used
+            raw = RAW_DATA[s_class] = Records(Snapshot(binary_path))
+        elif path.exists(file_path):
+            with open(file_path, 'r') as f:
+                raw.update(json.load(f))
+            rewrite = self.file_format == 'binary'
+        elif path.exists(binary_path):
+            raw.update(read_binary(binary_path))
+            rewrite = True
+        if self.mode == 'journal':
+            # Apply the changes made since the snapshot
+            for entry in self._journal(cls).replay():
+                if entry.get('op') == 'save':
+                    raw[entry['id']] = entry['obj']
+                elif entry.get('op') == 'remove':
+                    raw.pop(entry['id'], None)
+            if self._version(cls) != self._versions[s_class]:
+                # Another process compacted the journal meanwhile: the
+                # entries it dropped may not be in the snapshot read
+                return self._load(cls)
+        if not self.lazy and isinstance(raw, Records):
+            DATA[s_class].update(raw.objects(cls))
+            raw = RAW_DATA[s_class] = {}
+        elif not self.lazy:
+            for obj_id, obj_json in raw.items():
+                DATA[s_class][obj_id] = cls(**obj_json)
+            raw = RAW_DATA[s_class] = {}
+        # Changes not flushed yet are newer than the files
+        for obj_id, obj in self._pending.get(s_class, {}).items():
+            raw.pop(obj_id, None)
+            if obj is None:
+                DATA[s_class].pop(obj_id, None)
+            else:
+                DATA[s_class][obj_id] = obj
+        self.rebuild_indexes(cls)
+        if self.shards > 1:
+            SHARD_IDS[s_class] = [set() for _ in range(self.shards)]
+            for obj_id in itertools.chain(DATA[s_class], raw):
+                SHARD_IDS[s_class][shard_of(obj_id, self.shards)].add(
+                    obj_id)
+        return rewrite
+
+    def _rewrite(self, cls: type):
+        """ Write the files of a class again in the layout and format
+        of the storage, then remove those of the previous ones
+        Called without the lock: in the "journal" mode, writing takes it
+        """
+        s_class = cls.__name__
+        self.save_all(cls)
+        if self.shards == 1:
+            remove_shards(s_class)
+        stale_path = ".db_{}.bin".format(s_class) \
+            if self.file_format == 'json' else ".db_{}.json".format(s_class)
+        if path.exists(stale_path):
+            os.remove(stale_path)
+
+    def _version(self, cls: type) -> Optional[tuple]:
+        """ Return the version of the files of a class
+        """
+        file_path = ".db_{}.json".format(cls.__name__)
+        if self.shards > 1:
+            return shards_version(cls.__name__, file_path)
+        return file_version(self._file_path(cls))
+
+    def _file_path(self, cls: type) -> str:
+        """ Return the file of a class, unsharded, in the file format
+        """
+        if self.file_format == 'binary':
+            return ".db_{}.bin".format(cls.__name__)
+        return ".db_{}.json".format(cls.__name__)
+
+    def _shard(self, cls: type, obj_id: str, add: bool):
+        """ Add an object ID to its shard, or remove it
+        Called with the lock held for writing
+        """
+        shard_ids = SHARD_IDS.get(cls.__name__)
+        if shard_ids is None:
+            return
+        if add:
+            shard_ids[shard_of(obj_id, self.shards)].add(obj_id)
+        else:
+            shard_ids[shard_of(obj_id, self.shards)].discard(obj_id)
+
+    def reload(self, cls: type):
+        """ Apply the changes made to the objects of a class by other
+        processes since they were loaded
+        A rewritten file is loaded again; in the "journal" mode, only
+        the entries appended to the journal since are applied
+        """
+        s_class = cls.__name__
+        journal = self._journal(cls) if self.mode == 'journal' else None
+        if s_class in self._versions and \
+                self._versions[s_class] == self._version(cls) and \
+                (journal is None or not journal.has_changes()):
+            return
+        rewrite = False
+        with self._lock(cls).write():
+            entries = journal.follow() if journal is not None else []
+            if self._versions.get(s_class) != self._version(cls) or \
+                    entries is None:
+                rewrite = self._load(cls)
+            else:
+                for entry in entries:
+                    self._apply(cls, entry)
+        if rewrite:
+            self._rewrite(cls)
+
+    def _caught_up(self, cls: type) -> dict:
+        """ Apply the journal entries other processes appended, then
+        return the current objects of a class, or the JSON of those not
+        built yet
+        Called by the journal, while appends are held off, to compact
+        """
+        s_class = cls.__name__
+        with self._lock(cls).write():
+            entries = self._journal(cls).follow()
+            if self._versions.get(s_class) != self._version(cls) or \
+                    entries is None:
+                # Compacted or checkpointed meanwhile by another process
+                self._load(cls)
+            else:
+                for entry in entries:
+                    self._apply(cls, entry)
+            return {**RAW_DATA.get(s_class, {}), **DATA.get(s_class, {})}
+
+    def _apply(self, cls: type, entry: dict):
+        """ Apply a journal entry to the objects of a class
+        Called with the lock held for writing
+        """
+        s_class = cls.__name__
+        obj_id = entry.get('id')
+        objs = DATA.setdefault(s_class, {})
+        raw = RAW_DATA.setdefault(s_class, {})
+        if entry.get('op') == 'save':
+            obj = objs.get(obj_id)
+            current = obj.to_json(True) if obj is not None \
+                else raw.get(obj_id)
+            if current == entry['obj']:
+                # Written by this process
+                return
+            objs.pop(obj_id, None)
+            raw[obj_id] = entry['obj']
+            self._shard(cls, obj_id, True)
+            self._unindex(cls, obj_id)
+            self._index_values(cls, obj_id, entry['obj'])
+            if not self.lazy:
+                self._build(cls, [obj_id])
+        elif entry.get('op') == 'remove':
+            objs.pop(obj_id, None)
+            raw.pop(obj_id, None)
+            self._shard(cls, obj_id, False)
+            self._unindex(cls, obj_id)
+
+    def _lookup(self, cls: type,
+                obj_ids: List[str]) -> Tuple[List[TypeVar('Base')],
+                                             List[str]]:
+        """ Return the objects of a class with these IDs, and the IDs
+        of those not built yet
+        Called with the lock held for reading
+        """
+        s_class = cls.__name__
+        objs = DATA.get(s_class, {})
+        raw = RAW_DATA.get(s_class, {})
+        found = []
+        pending = []
+        for obj_id in obj_ids:
+            obj = objs.get(obj_id)
+            if obj is not None:
+                found.append(obj)
+            elif obj_id in raw:
+                pending.append(obj_id)
+        return found, pending
+
+    def _build(self, cls: type,
+               obj_ids: List[str]) -> List[TypeVar('Base')]:
+        """ Build the objects of a class with these IDs from their JSON,
+        and return them
+        Called with the lock held for writing
+        """
+        s_class = cls.__name__
+        objs = DATA.setdefault(s_class, {})
+        raw = RAW_DATA.get(s_class, {})
+        built = []
+        for obj_id in obj_ids:
+            obj_json = raw.pop(obj_id, None)
+            if obj_json is not None:
+                objs[obj_id] = cls(**obj_json)
+            # Built meanwhile by another thread, or removed
+            if objs.get(obj_id) is not None:
+                built.append(objs[obj_id])
+        return built
+
+    def _journal(self, cls: type) -> Journal:
+        """ Return the journal of a class
+        """
+        s_class = cls.__name__
+        if JOURNALS.get(s_class) is None:
+            JOURNALS[s_class] = Journal(
+                s_class, functools.partial(self._write_snapshot, cls))
+        return JOURNALS[s_class]
+
+    def _write_snapshot(self, cls: type, objs_json: dict):
+        """ Write the snapshot a journal compacts into, in the layout and
+        format of the storage
+        """
+        s_class = cls.__name__
+        if self.shards > 1:
+            write_shards(s_class, self.shards, objs_json,
+                         ".db_{}.json".format(s_class))
+        elif self.file_format == 'binary':
+            write_binary(self._file_path(cls), objs_json)
+        else:
+            write_snapshot(self._file_path(cls), objs_json)
+        # The objects were caught up with the journal before it was
+        # compacted, and no other process writes meanwhile: not a change
+        # to reload
+        self._versions[s_class] = self._version(cls)
+
+    def rebuild_indexes(self, cls: type):
+        """ Rebuild the secondary indexes of a class from all objects
+        Sorted indexes are dropped, to be built again on first use
+        """
+        s_class = cls.__name__
+        indexes = INDEX_DATA[s_class] = {attr: {} for attr in cls.INDEXES}
+        SORTED_DATA[s_class] = {}
+        indexed_values = INDEXED_VALUES[s_class] = {}
+        built = ((obj_id, {attr: attribute_index_value(obj, attr)
+                           for attr in cls.INDEXES})
+                 for obj_id, obj in DATA.get(s_class, {}).items())
+        # As _index_values does for each object, with no sorted index
+        for obj_id, values in itertools.chain(
+                built, self._raw_values(cls, cls.INDEXES)):
+            indexed = {}
+            for attr in cls.INDEXES:
+                value = values.get(attr)
+                try:
+                    indexes[attr].setdefault(value, set()).add(obj_id)
+                except TypeError:
+                    # Unhashable values are only found by a full scan
+                    continue
+                indexed[attr] = value
+            indexed_values[obj_id] = indexed
+
+    def _raw_values(self, cls: type,
+                    attrs: Tuple[str]) -> Iterator[Tuple[str, dict]]:
+        """ Yield the ID of each object not built yet with its JSON, or
+        at least the values of some attributes
+        Records of a binary snapshot only decode those attributes
+        """
+        raw = RAW_DATA.get(cls.__name__, {})
+        if isinstance(raw, Records):
+            return raw.values_of(attrs)
+        return iter(raw.items())
+
+    def _indexed(self, cls: type) -> Tuple[str]:
+        """ Return the indexed attributes of a class
+        """
+        return cls.INDEXES + tuple(
+            attr for attr in SORTED_DATA.get(cls.__name__, {})
+            if attr not in cls.INDEXES)
+
+    def _index(self, obj: TypeVar('Base')):
+        """ Index an object under its current attribute values
+        """
+        cls = obj.__class__
+        self._unindex(cls, obj.id)
+        self._index_values(
+            cls, obj.id, {attr: attribute_index_value(obj, attr)
+                          for attr in self._indexed(cls)})
+
+    def _index_values(self, cls: type, obj_id: str, values: dict):
+        """ Index an object ID under the values of the indexed attributes
+        Timestamps are expected as strings, as in the JSON of objects
+        """
+        s_class = cls.__name__
+        indexes = INDEX_DATA.setdefault(
+            s_class, {attr: {} for attr in cls.INDEXES})
+        sorted_indexes = SORTED_DATA.setdefault(s_class, {})
+        indexed = {}
+        for attr in self._indexed(cls):
+            value = values.get(attr)
+            if attr in indexes:
+                try:
+                    indexes[attr].setdefault(value, set()).add(obj_id)
+                except TypeError:
+                    # Unhashable values are only found by a full scan
+                    continue
+            if sorted_indexes.get(attr) is not None:
+                try:
+                    sorted_indexes[attr].add(value, obj_id)
+                except TypeError:
+                    # Values of mixed types: scan instead
+                    sorted_indexes[attr] = None
+            indexed[attr] = value
+        INDEXED_VALUES.setdefault(s_class, {})[obj_id] = indexed
+
+    def _unindex(self, cls: type, obj_id: str):
+        """ Remove an object ID from the secondary indexes
+        """
+        s_class = cls.__name__
+        values = INDEXED_VALUES.get(s_class, {}).pop(obj_id, None)
+        if values is None:
+            return
+        indexes = INDEX_DATA[s_class]
+        sorted_indexes = SORTED_DATA.get(s_class, {})
+        for attr, value in values.items():
+            if attr in indexes:
+                bucket = indexes[attr].get(value, set())
+                bucket.discard(obj_id)
+                if len(bucket) == 0:
+                    indexes[attr].pop(value, None)
+            if sorted_indexes.get(attr) is not None:
+                sorted_indexes[attr].discard(value, obj_id)
+
+    def _build_sorted_indexes(self, cls: type, query: dict):
+        """ Build the sorted indexes a query can use, that were not used
+        before
+        """
+        self._build_sorted_index(
+            cls, [attr for attr, condition in query.items()
+                  if attr in cls.SORTED_INDEXES and is_operator(condition)])
+
+    def _build_sorted_index(self, cls: type, attrs: List[str]):
+        """ Build the sorted indexes of some attributes, those not built
+        yet
+        """
+        s_class = cls.__name__
+        attrs = [attr for attr in attrs
+                 if attr not in SORTED_DATA.get(s_class, {})]
+        if len(attrs) == 0:
+            return
+        with self._lock(cls).write():
+            sorted_indexes = SORTED_DATA.setdefault(s_class, {})
+            values = INDEXED_VALUES.setdefault(s_class, {})
+            for attr in attrs:
+                if attr in sorted_indexes:
+                    # Built meanwhile by another thread
+                    continue
+                pairs = [(attribute_index_value(obj, attr), obj_id)
+                         for obj_id, obj in DATA.get(s_class, {}).items()]
+                pairs += [(values.get(attr), obj_id) for obj_id, values
+                          in self._raw_values(cls, (attr,))]
+                try:
+                    sorted_indexes[attr] = SortedIndex(pairs)
+                except TypeError:
+                    sorted_indexes[attr] = None
+                for value, obj_id in pairs:
+                    values.setdefault(obj_id, {})[attr] = value
+
+    def save_all(self, cls: type):
+        """ Save all objects of a class to its file
+        """
+        with self._write_lock(cls):
+            with self._lock(cls).read():
+                objs_json = self._objs_json(cls)
+                # Changes hold the write lock: none is missing
+                pending = self._pending.pop(cls.__name__, None)
+            try:
+                self._write(cls, objs_json)
+            except BaseException:
+                if pending is not None:
+                    with self._lock(cls).write():
+                        pending.update(self._pending.get(cls.__name__, {}))
+                        self._pending[cls.__name__] = pending
+                raise
+
+    def _objs_json(self, cls: type,
+                   obj_ids: Optional[List[str]] = None) -> dict:
+        """ Return the objects of a class with these IDs, or all of
+        them, JSON represented for the file
+        Called with the lock held
+        """
+        s_class = cls.__name__
+        objs = DATA.get(s_class, {})
+        raw = RAW_DATA.get(s_class, {})
+        if obj_ids is None:
+            # Objects not built yet are written back as they were read
+            objs_json = dict(raw.items())
+            obj_ids = list(objs)
+        else:
+            objs_json = {obj_id: raw[obj_id] for obj_id in obj_ids
+                         if obj_id in raw}
+        for obj_id in obj_ids:
+            obj = objs.get(obj_id)
+            if obj is not None:
+                objs_json[obj_id] = obj.to_json(True)
+        return objs_json
+
+    def _write(self, cls: type, objs_json: dict):
+        """ Write all objects of a class to its files
+        Called with the write mutex of the class held, see _write_lock
+        """
+        s_class = cls.__name__
+        file_path = ".db_{}.json".format(s_class)
+        if self.mode == 'journal':
+            # The snapshot now holds every change
+            self._journal(cls).checkpoint(
+                objs_json, functools.partial(self._caught_up, cls))
+        elif self.shards > 1:
+            write_shards(s_class, self.shards, objs_json, file_path)
+        elif self.file_format == 'binary':
+            write_binary(self._file_path(cls), objs_json)
+        elif self.mode == 'deferred':
+            write_snapshot(file_path, objs_json)
+        else:
+            with open(file_path, 'w') as f:
+                json.dump(objs_json, f)
+        # Not a change to reload
+        self._versions[s_class] = self._version(cls)
+
+    def _save_shard(self, cls: type, obj_id: str):
+        """ Write the shard file holding an object ID
+        """
+        s_class = cls.__name__
+        shard = shard_of(obj_id, self.shards)
+        with self._write_lock(cls):
+            with self._lock(cls).read():
+                objs_json = self._objs_json(
+                    cls, list(SHARD_IDS[s_class][shard]))
+            write_shard(s_class, shard, objs_json)
+            self._versions[s_class] = self._version(cls)
+
+    def _persist(self, obj: TypeVar('Base'), op: str):
+        """ Persist a "save" or "remove" of an object
+        according to the storage mode
+        """
+        cls = obj.__class__
+        s_class = cls.__name__
+        if self.mode == 'journal':
+            obj_json = obj.to_json(True) if op == 'save' else None
+            self._journal(cls).append(
+                op, obj.id, obj_json, functools.partial(self._caught_up, cls))
+        elif self.mode == 'deferred':
+            self.flusher.mark_dirty(cls)
+        elif self.shards > 1 and s_class in SHARD_IDS:
+            self._save_shard(cls, obj.id)
+        else:
+            self.save_all(cls)
+
+    def save(self, obj: TypeVar('Base')):
+        """ Add or update an object
+        """
+        s_class = obj.__class__.__name__
+        with self._lock(obj.__class__).write():
+            DATA.setdefault(s_class, {})[obj.id] = obj
+            RAW_DATA.get(s_class, {}).pop(obj.id, None)
+            self._shard(obj.__class__, obj.id, True)
+            self._index(obj)
+            if self.mode == 'deferred':
+                self._pending.setdefault(s_class, {})[obj.id] = obj
+        self._persist(obj, 'save')
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        s_class = obj.__class__.__name__
+        with self._lock(obj.__class__).write():
+            RAW_DATA.get(s_class, {}).pop(obj.id, None)
+            if DATA.get(s_class, {}).pop(obj.id, None) is None:
+                return
+            self._shard(obj.__class__, obj.id, False)
+            self._unindex(obj.__class__, obj.id)
+            if self.mode == 'deferred':
+                self._pending.setdefault(s_class, {})[obj.id] = None
+        self._persist(obj, 'remove')
+
+    def count(self, cls: type, query: dict = None) -> int:
+        """ Count the objects of a class meeting a query, or all of them
+        A query answered by an index alone is counted without
+        looking at the objects, by the values they were saved with
+        """
+        s_class = cls.__name__
+        if not query:
+            with self._lock(cls).read():
+                return len(DATA.get(s_class, {}).keys()) + \
+                    len(RAW_DATA.get(s_class, {}).keys())
+        self._build_sorted_indexes(cls, query)
+        with self._lock(cls).read():
+            obj_ids, exact = self._plan(cls, query)
+        if exact:
+            return len(obj_ids)
+        return sum(1 for obj in self._matching(cls, query, obj_ids))
+
+    def first(self, cls: type, query: dict = {}) -> TypeVar('Base'):
+        """ Return one object of a class meeting a query, or None
+        Objects are matched in the order of the index used, and the
+        scan stops at the first match
+        """
+        self._build_sorted_indexes(cls, query)
+        with self._lock(cls).read():
+            obj_ids, exact = self._plan(cls, query)
+        return next(self._matching(cls, query, obj_ids), None)
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID
+        """
+        objs = self._fetch(cls, [id])
+        return objs[0] if len(objs) > 0 else None
+
+    def _fetch(self, cls: type,
+               obj_ids: List[str]) -> List[TypeVar('Base')]:
+        """ Return the objects of a class with these IDs, in the same
+        order, building those not built yet
+        """
+        with self._lock(cls).read():
+            objs, pending = self._lookup(cls, obj_ids)
+        if len(pending) == 0 and len(objs) == len(obj_ids):
+            return objs
+        if len(pending) > 0:
+            with self._lock(cls).write():
+                objs += self._build(cls, pending)
+        by_id = {obj.id: obj for obj in objs}
+        return [by_id[obj_id] for obj_id in obj_ids if obj_id in by_id]
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects of a class meeting a query
+        Only the objects found by the most selective index usable by
+        the query are matched, see _plan
+        """
+        self._build_sorted_indexes(cls, attributes)
+        with self._lock(cls).read():
+            obj_ids, _ = self._plan(cls, attributes)
+            if obj_ids is None:
+                objs = list(DATA.get(cls.__name__, {}).values())
+                obj_ids = list(RAW_DATA.get(cls.__name__, {}))
+            else:
+                objs, obj_ids = self._lookup(cls, obj_ids)
+        if len(obj_ids) > 0:
+            # Objects not built yet, in lazy mode
+            with self._lock(cls).write():
+                objs += self._build(cls, obj_ids)
+        # Even when the index alone answers the query: it holds the
+        # values saved, and objects may have been changed since
+        return [obj for obj in objs if matches(obj, attributes)]
+
+    def _matching(self, cls: type, query: dict,
+                  obj_ids: Optional[List[str]],
+                  chunk_size: int = 100) -> Iterator[TypeVar('Base')]:
+        """ Yield the objects of a class with these IDs, or all of them
+        if None, that meet a query, building them a chunk at a time
+        """
+        if obj_ids is None:
+            with self._lock(cls).read():
+                obj_ids = list(DATA.get(cls.__name__, {})) + \
+                    list(RAW_DATA.get(cls.__name__, {}))
+        for i in range(0, len(obj_ids), chunk_size):
+            for obj in self._fetch(cls, obj_ids[i:i + chunk_size]):
+                if matches(obj, query):
+                    yield obj
+
+    def _plan(self, cls: type,
+              query: dict) -> Tuple[Optional[List[str]], bool]:
+        """ Return the IDs of the objects that may meet a query, from
+        the index giving the fewest, or None if no index can be used,
+        and whether they all meet the query
+        Called with the lock held for reading
+        """
+        best = None
+        best_exact = False
+        for attr, condition in query.items():
+            try:
+                found = self._index_lookup(cls, attr, condition)
+            except (TypeError, ValueError):
+                # Operands that cannot be compared to the values
+                continue
+            if found is None:
+                continue
+            obj_ids, exact = found
+            if best is None or len(obj_ids) < len(best):
+                best = obj_ids
+                best_exact = exact and len(query) == 1
+        return best, best_exact
+
+    def _index_lookup(self, cls: type, attr: str,
+                      condition) -> Optional[Tuple[List[str], bool]]:
+        """ Return the IDs of the objects that may meet the condition
+        on an attribute, according to its indexes, and whether they
+        all meet it; or None if the attribute has no usable index
+        """
+        s_class = cls.__name__
+        indexes = INDEX_DATA.get(s_class, {})
+        sorted_index = SORTED_DATA.get(s_class, {}).get(attr)
+        if not is_operator(condition):
+            condition = {'eq': condition}
+        if hasattr(getattr(cls, attr, None), 'to_string'):
+            # Sorted as strings, timestamps are compared as datetimes
+            condition = _timestamp_condition(condition)
+            if condition is None:
+                return [], True
+        ops = set(condition)
+        if ops <= {'eq', 'in'} and attr in indexes:
+            # With both, the bucket of "eq" is filtered by "in" later
+            values = [condition['eq']] if 'eq' in ops else condition['in']
+            obj_ids = set()
+            for value in values:
+                obj_ids |= indexes[attr].get(index_value(value), set())
+            return list(obj_ids), len(ops) == 1
+        operands = condition['in'] if ops == {'in'} else condition.values()
+        if sorted_index is None or None in operands:
+            # None values are not in sorted indexes
+            return None
+        if ops <= set(RANGE_OPERATORS) | {'eq'}:
+            low, high, include_low, include_high = _bounds(condition)
+            return sorted_index.range(low, high, include_low,
+                                      include_high), True
+        if 'prefix' in ops:
+            return sorted_index.prefix(condition['prefix']), len(ops) == 1
+        if ops == {'in'}:
+            obj_ids = set()
+            for value in operands:
+                obj_ids.update(sorted_index.range(*_bounds({'eq': value})))
+            return list(obj_ids), True
+        return None
+
+    def page(self, cls: type, limit: int = None, cursor: str = None,
+             order_by: str = 'id') -> Tuple[List[TypeVar('Base')],
+                                            Optional[str]]:
+        """ Return up to limit objects of a class sorted by order_by,
+        after the cursor, and the cursor of the next page, or None
+        The page is found by bisection in the sorted index of order_by,
+        built on first use, and only its objects are built in lazy mode
+        """
+        s_class = cls.__name__
+        after = parse_cursor(cursor, order_by) if cursor is not None \
+            else None
+        self._build_sorted_index(cls, [order_by])
+        with self._lock(cls).read():
+            index = SORTED_DATA.get(s_class, {}).get(order_by)
+            size = len(DATA.get(s_class, {})) + \
+                len(RAW_DATA.get(s_class, {}))
+            if index is not None and len(index) == size:
+                pairs = index.page(
+                    None if after is None else (after[0], after[-1]),
+                    None if limit is None else limit + 1)
+            else:
+                # Values that cannot be sorted together, or are None
+                pairs = None
+                objs = list(DATA.get(s_class, {}).values())
+                objs_json = list(RAW_DATA.get(s_class, {}).values())
+        if pairs is not None:
+            keyed = [((obj_id,) if order_by == 'id' else (value, obj_id),
+                      obj_id) for value, obj_id in pairs]
+        else:
+            keyed = self._scan_page(objs, objs_json, limit, after, order_by)
+        next_cursor = None
+        if limit is not None and len(keyed) > limit:
+            keyed = keyed[:limit]
+            next_cursor = make_cursor(keyed[-1][0])
+        return self._fetch(cls, [obj_id for key, obj_id in keyed]), \
+            next_cursor
+
+    @staticmethod
+    def _scan_page(objs: List[TypeVar('Base')], objs_json: List[dict],
+                   limit: Optional[int], after: Optional[tuple],
+                   order_by: str) -> List[Tuple[tuple, str]]:
+        """ Return the keys and IDs of up to limit + 1 objects, or
+        their JSON, sorted by order_by, after the key after
+        Only the limit + 1 smallest keys are kept while scanning
+        """
+        keys = itertools.chain(
+            ((object_sort_key(obj, order_by), obj.id) for obj in objs),
+            ((sort_key(obj_json, order_by), obj_json.get('id'))
+             for obj_json in objs_json))
+        if after is not None:
+            keys = (item for item in keys if item[0] > after)
+        if limit is None:
+            return sorted(keys)
+        return heapq.nsmallest(limit + 1, keys)
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+""" Shards module
+Sharded on-disk layout of the JSON storage: the objects of a class are
+spread over .db_<Class>.shard<N>.json files by a hash of their ID
+"""
+import glob
+import json
+import os
+import re
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from os import getenv, path
+from typing import Dict, Optional, Tuple
+from models.journal import write_snapshot
+
+
+# Number of threads reading shard files at the same time
+SHARD_THREADS = int(getenv('STORAGE_SHARD_THREADS', 8))
+
+
+def shard_of(obj_id: str, shards: int) -> int:
+    """ Return the shard of an object ID, the same in every process,
+    unlike hash()
+    """
+    return zlib.crc32(obj_id.encode('utf-8')) % shards
+
+
+def shard_path(s_class: str, shard: int) -> str:
+    """ Return the file of a shard of a class
+    """
+    return ".db_{}.shard{}.json".format(s_class, shard)
+
+
+def shard_files(s_class: str) -> Dict[int, str]:
+    """ Return the shard files of a class on disk, by shard
+    """
+    pattern = re.compile(r"\.db_{}\.shard(\d+)\.json$".format(
+        re.escape(s_class)))
+    files = {}
+    for file_path in glob.glob(".db_{}.shard*.json".format(
+            glob.escape(s_class))):
+        match = pattern.match(path.basename(file_path))
+        if match is not None:
+            files[int(match.group(1))] = file_path
+    return files
+
+
+def shards_version(s_class: str, file_path: str) -> tuple:
+    """ Return a marker that changes whenever a shard file, or the
+    file of the unsharded layout, is written or removed
+    """
+    files = [file_path] + [file_path for shard, file_path
+                           in sorted(shard_files(s_class).items())]
+    versions = []
+    for file_path in files:
+        try:
+            stat = os.stat(file_path)
+        except FileNotFoundError:
+            continue
+        versions.append((file_path, stat.st_ino, stat.st_mtime_ns,
+                         stat.st_size))
+    return tuple(versions)
+
+
+def _read_shard(shard: int, file_path: str,
+                shards: int) -> Tuple[dict, bool]:
+    """ Read a shard file, and tell whether it holds objects that
+    belong to another shard with this number of shards
+    """
+    with open(file_path, 'r') as f:
+        objs_json = json.load(f)
+    misplaced = shard >= shards or any(
+        shard_of(obj_id, shards) != shard for obj_id in objs_json)
+    return objs_json, misplaced
+
+
+def read_shards(s_class: str, shards: int,
+                file_path: str) -> Tuple[dict, bool]:
+    """ Read the shard files of a class in parallel, then the file of
+    the unsharded layout if there is one
+    Return the objects JSON by ID, and whether the files must be
+    written again: the layout or the number of shards changed
+    """
+    files = shard_files(s_class)
+    with ThreadPoolExecutor(max_workers=SHARD_THREADS) as pool:
+        results = list(pool.map(
+            lambda item: _read_shard(item[0], item[1], shards),
+            files.items()))
+    objs_json = {}
+    rewrite = False
+    if path.exists(file_path):
+        with open(file_path, 'r') as f:
+            objs_json.update(json.load(f))
+        rewrite = True
+    for shard_json, misplaced in results:
+        objs_json.update(shard_json)
+        rewrite = rewrite or misplaced
+    return objs_json, rewrite
+
+
+def write_shard(s_class: str, shard: int, objs_json: dict):
+    """ Atomically replace the file of one shard
+    """
+    write_snapshot(shard_path(s_class, shard), objs_json)
+
+
+def write_shards(s_class: str, shards: int, objs_json: dict,
+                 file_path: Optional[str] = None):
+    """ Write all the shard files of a class, then remove the files of
+    another number of shards, and the file of the unsharded layout
+    Written in turn, not by a thread pool: the flusher calls this at
+    exit, when no new thread can start
+    """
+    grouped = [{} for _ in range(shards)]
+    for obj_id, obj_json in objs_json.items():
+        grouped[shard_of(obj_id, shards)][obj_id] = obj_json
+    for shard in range(shards):
+        write_shard(s_class, shard, grouped[shard])
+    remove_shards(s_class, shards)
+    if file_path is not None and path.exists(file_path):
+        os.remove(file_path)
+
+
+def remove_shards(s_class: str, first: int = 0):
+    """ Remove the shard files of a class from a shard on
+    """
+    for shard, file_path in shard_files(s_class).items():
+        if shard >= first:
+            os.remove(file_path)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+""" Sorted index module
+Ordered index used by the JSON storage for range and prefix queries
+"""
+from bisect import bisect_left, bisect_right
+from typing import Any, List
+
+
+class SortedIndex():
+    """ Object IDs sorted by the value of one attribute
+
+    Values and IDs are kept in two parallel lists, so that the IDs
+    of a range of values are found by bisection; IDs under the same
+    value are sorted too, for pages. None values are not indexed: they
+    never meet a range or a prefix
+    """
+
+    def __init__(self, pairs: List[tuple] = ()):
+        """ Initialize the index from (value, object ID) pairs
+        Raise TypeError if the values cannot be sorted together
+        """
+        pairs = sorted(pair for pair in pairs if pair[0] is not None)
+        self.values = [value for value, obj_id in pairs]
+        self.ids = [obj_id for value, obj_id in pairs]
+
+    def __len__(self) -> int:
+        """ Number of indexed objects
+        """
+        return len(self.ids)
+
+    def add(self, value: Any, obj_id: str):
+        """ Index an object ID under a value
+        Raise TypeError if the value cannot be compared to the others
+        """
+        if value is None:
+            return
+        low = bisect_left(self.values, value)
+        i = bisect_right(self.ids, obj_id, low,
+                         bisect_right(self.values, value, low))
+        self.values.insert(i, value)
+        self.ids.insert(i, obj_id)
+
+    def discard(self, value: Any, obj_id: str):
+        """ Remove an object ID indexed under a value, if it is
+        """
+        if value is None:
+            return
+        try:
+            i = self.ids.index(obj_id, bisect_left(self.values, value),
+                               bisect_right(self.values, value))
+        except (TypeError, ValueError):
+            return
+        del self.values[i]
+        del self.ids[i]
+
+    def range(self, low: Any = None, high: Any = None,
+              include_low: bool = True,
+              include_high: bool = True) -> List[str]:
+        """ Return the IDs of the objects with a value between low
+        and high, None meaning no bound
+        """
+        start = 0
+        end = len(self.values)
+        if low is not None:
+            bisect = bisect_left if include_low else bisect_right
+            start = bisect(self.values, low)
+        if high is not None:
+            bisect = bisect_right if include_high else bisect_left
+            end = bisect(self.values, high)
+        return self.ids[start:end]
+
+    def prefix(self, prefix: str) -> List[str]:
+        """ Return the IDs of the objects with a value starting with
+        a prefix
+        """
+        if prefix == "":
+            start = bisect_left(self.values, "")
+            return self.ids[start:]
+        # Strings starting with the prefix sort before its successor
+        successor = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return self.range(prefix, successor, True, False)
+
+    def page(self, after: tuple = None, limit: int = None) -> List[tuple]:
+        """ Return up to limit (value, object ID) pairs, sorted by value
+        then by ID, following the (value, object ID) pair after
+        """
+        start = 0
+        if after is not None:
+            value, obj_id = after
+            low = bisect_left(self.values, value)
+            start = bisect_right(self.ids, obj_id, low,
+                                 bisect_right(self.values, value, low))
+        end = len(self.ids) if limit is None else start + limit
+        return list(zip(self.values[start:end], self.ids[start:end]))
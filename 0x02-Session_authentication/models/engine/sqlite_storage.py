@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+""" SQLite storage module
+Backend keeping the objects in a SQLite database
+"""
+from os import getenv, path
+from typing import TypeVar, List, Optional, Tuple
+import json
+import sqlite3
+import threading
+from models.engine.storage import Storage, matches, object_sort_key, \
+    parse_cursor, make_cursor, is_operator
+
+
+# Path of the SQLite database file
+SQLITE_PATH = getenv('STORAGE_SQLITE_PATH', '.db.sqlite3')
+
+
+# SQL of the operators of the search queries
+SQL_OPERATORS = {'eq': 'IS', 'gt': '>', 'gte': '>=', 'lt': '<', 'lte': '<='}
+
+
+def _condition(attr: str, condition, params: list) -> Optional[str]:
+    """ Return the SQL of a query condition on a column, adding its
+    parameters, or None if SQLite cannot check it like Python does
+    """
+    if not is_operator(condition):
+        condition = {'eq': condition}
+    for arg in condition.values():
+        args = arg if isinstance(arg, (list, tuple, set)) else [arg]
+        if not all(value is None or type(value) in (str, int, float)
+                   for value in args):
+            return None
+    sql = []
+    args = []
+    for op, arg in condition.items():
+        if op == 'in':
+            if not isinstance(arg, (list, tuple, set)):
+                return None
+            arg = list(arg)
+            if None in arg:
+                # NULL is never IN a list in SQL
+                return None
+            sql.append('"{}" IN ({})'.format(
+                attr, ", ".join("?" * len(arg))))
+            args += arg
+        elif op != 'eq' and type(arg) is not str:
+            # SQLite sorts values of different types where Python
+            # raises: only compare strings
+            return None
+        elif op == 'prefix':
+            if arg == "":
+                return None
+            # Strings starting with the prefix sort before its successor
+            sql.append('"{0}" >= ? AND "{0}" < ?'.format(attr))
+            args += [arg, arg[:-1] + chr(ord(arg[-1]) + 1)]
+        else:
+            sql.append('"{}" {} ?'.format(attr, SQL_OPERATORS[op]))
+            args.append(arg)
+    params += args
+    return " AND ".join(sql)
+
+
+class SQLiteStorage(Storage):
+    """ Storage keeping the objects of each class in a table
+
+    Each row holds the object's JSON in a "data" column, next to one
+    indexed column per attribute listed in the INDEXES of the class,
+    so searches on those attributes use a SQLite index
+    """
+
+    def __init__(self, db_path: str = SQLITE_PATH):
+        """ Open the database
+        """
+        self.db_path = db_path
+        self._conn = sqlite3.connect(db_path, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # The connection is shared by the request threads
+        self._lock = threading.Lock()
+        self._tables = set()
+
+    def _table(self, cls: type) -> str:
+        """ Create the table of a class and its indexes if needed,
+        and return its name
+        A new table is filled from the .db_<Class>.json file of the
+        JSON storage, if there is one, see import_json
+        """
+        s_class = cls.__name__
+        if s_class not in self._tables:
+            columns = "".join(', "{}"'.format(attr) for attr in cls.INDEXES)
+            with self._lock:
+                created = self._conn.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' "
+                    "AND name = ?", (s_class,)).fetchone() is None
+                self._conn.execute(
+                    'CREATE TABLE IF NOT EXISTS "{}" '
+                    '(id TEXT PRIMARY KEY{}, data TEXT NOT NULL)'
+                    .format(s_class, columns))
+                for attr in cls.INDEXES:
+                    self._conn.execute(
+                        'CREATE INDEX IF NOT EXISTS "{0}_{1}" '
+                        'ON "{0}" ("{1}")'.format(s_class, attr))
+            self._tables.add(s_class)
+            if created:
+                # First use of the SQLite backend: bring the objects of
+                # the JSON storage over, once, so that removing them all
+                # does not bring them back
+                self.import_json(cls)
+        return s_class
+
+    def _row(self, obj: TypeVar('Base')) -> tuple:
+        """ Return the column values of an object
+        """
+        return (obj.id,) + \
+            tuple(getattr(obj, attr, None) for attr in obj.INDEXES) + \
+            (json.dumps(obj.to_json(True)),)
+
+    def load(self, cls: type):
+        """ Nothing to load: objects are read on demand
+        """
+        self._table(cls)
+
+    def save_all(self, cls: type):
+        """ Nothing to save: every change is written immediately
+        """
+        self._table(cls)
+
+    def import_json(self, cls: type, file_path: str = None):
+        """ Copy the objects of a class from its .db_<Class>.json file,
+        in one transaction
+        Called when the table of the class is created
+        """
+        table = self._table(cls)
+        if file_path is None:
+            file_path = ".db_{}.json".format(table)
+        if not path.exists(file_path):
+            return
+        with open(file_path, 'r') as f:
+            objs_json = json.load(f)
+        rows = (self._row(cls(**obj_json)) for obj_json in objs_json.values())
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO "{}" VALUES ({})'.format(
+                    table, ", ".join("?" * (len(cls.INDEXES) + 2))), rows)
+            self._conn.execute("COMMIT")
+
+    def save(self, obj: TypeVar('Base')):
+        """ Insert or update an object
+        """
+        table = self._table(obj.__class__)
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO "{}" VALUES ({})'.format(
+                    table, ", ".join("?" * (len(obj.INDEXES) + 2))),
+                self._row(obj))
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Delete an object
+        """
+        table = self._table(obj.__class__)
+        with self._lock:
+            self._conn.execute(
+                'DELETE FROM "{}" WHERE id = ?'.format(table), (obj.id,))
+
+    def count(self, cls: type, query: dict = None) -> int:
+        """ Count the objects of a class meeting a query, or all of them
+        """
+        table = self._table(cls)
+        where, params, complete = self._where(cls, query or {})
+        if not complete:
+            return len(self.search(cls, query))
+        with self._lock:
+            return self._conn.execute(
+                'SELECT COUNT(*) FROM "{}"{}'.format(table, where),
+                params).fetchone()[0]
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID
+        """
+        table = self._table(cls)
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT data FROM "{}" WHERE id = ?'.format(table),
+                (id,)).fetchone()
+        if row is None:
+            return None
+        return cls(**json.loads(row[0]))
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Search all objects of a class meeting a query
+        Conditions on the id and indexed attributes run in SQLite,
+        the other ones on the loaded objects
+        """
+        table = self._table(cls)
+        where, params, complete = self._where(cls, attributes)
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT data FROM "{}"{}'.format(table, where),
+                params).fetchall()
+        objs = (cls(**json.loads(row[0])) for row in rows)
+        return [obj for obj in objs if matches(obj, attributes)]
+
+    def _where(self, cls: type, query: dict) -> Tuple[str, list, bool]:
+        """ Return the WHERE clause and parameters of the conditions of
+        a query that SQLite can check, and whether it checks them all
+        """
+        conditions = []
+        params = []
+        complete = True
+        for attr, condition in query.items():
+            sql = None
+            if attr == 'id' or attr in cls.INDEXES:
+                sql = _condition(attr, condition, params)
+            if sql is None:
+                complete = False
+                continue
+            conditions.append(sql)
+        if len(conditions) == 0:
+            return "", params, complete
+        return " WHERE " + " AND ".join(conditions), params, complete
+
+    def page(self, cls: type, limit: int = None, cursor: str = None,
+             order_by: str = 'id') -> Tuple[List[TypeVar('Base')],
+                                            Optional[str]]:
+        """ Return up to limit objects of a class sorted by order_by,
+        after the cursor, and the cursor of the next page, or None
+        """
+        table = self._table(cls)
+        if order_by == 'created_at':
+            columns = "(json_extract(data, '$.created_at'), id)"
+        else:
+            columns = "(id)"
+        query = 'SELECT data FROM "{}"'.format(table)
+        params = []
+        if cursor is not None:
+            after = parse_cursor(cursor, order_by)
+            query += " WHERE {} > ({})".format(
+                columns, ", ".join("?" * len(after)))
+            params += after
+        query += " ORDER BY {} LIMIT ?".format(columns[1:-1])
+        params.append(-1 if limit is None else limit + 1)
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+        objs = [cls(**json.loads(row[0])) for row in rows]
+        if limit is None or len(objs) <= limit:
+            return objs, None
+        objs = objs[:limit]
+        return objs, make_cursor(object_sort_key(objs[-1], order_by))
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+""" Storage module
+Interface implemented by the storage backends of Base
+"""
+from datetime import datetime
+from functools import lru_cache
+from typing import Any, TypeVar, List, Optional, Tuple
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S"
+
+
+def _comparable(value: Any, arg: Any) -> Tuple[Any, Any]:
+    """ Return a value and an operand that can be compared: a string
+    operand is parsed when the value is a datetime
+    """
+    if isinstance(value, datetime) and isinstance(arg, str):
+        arg = _parse_timestamp(arg)
+    return value, arg
+
+
+@lru_cache(maxsize=1024)
+def _parse_timestamp(string: str) -> datetime:
+    """ Parse a timestamp operand, once for all the objects scanned
+    """
+    return datetime.strptime(string, TIMESTAMP_FORMAT)
+
+
+def _equal(value: Any, arg: Any) -> bool:
+    """ Tell whether a value equals an operand, parsing the operand
+    like the other operators do
+    """
+    try:
+        value, arg = _comparable(value, arg)
+    except ValueError:
+        return False
+    return value == arg
+
+
+def _starts_with(value: Any, prefix: str) -> bool:
+    """ Tell whether a value is a string starting with a prefix
+    """
+    return isinstance(value, str) and value.startswith(prefix)
+
+
+# Operators of the search queries: an attribute can be given a dict of
+# operators and operands instead of a value, like
+# {"email": {"prefix": "bob@"}, "created_at": {"gte": since}}
+OPERATORS = {
+    'eq': lambda value, arg: value == arg,
+    'in': lambda value, arg: any(_equal(value, item) for item in arg),
+    'prefix': lambda value, arg: _starts_with(value, arg),
+    'gt': lambda value, arg: value > arg,
+    'gte': lambda value, arg: value >= arg,
+    'lt': lambda value, arg: value < arg,
+    'lte': lambda value, arg: value <= arg,
+}
+RANGE_OPERATORS = ('gt', 'gte', 'lt', 'lte')
+
+
+def is_operator(condition: Any) -> bool:
+    """ Tell whether a query condition is a dict of operators rather
+    than a value to compare to
+    """
+    return type(condition) is dict and len(condition) > 0 and \
+        all(op in OPERATORS for op in condition)
+
+
+def match_value(value: Any, condition: Any) -> bool:
+    """ Tell whether a value meets a query condition
+    """
+    if not is_operator(condition):
+        condition = {'eq': condition}
+    for op, arg in condition.items():
+        try:
+            if not OPERATORS[op](*_comparable(value, arg)):
+                return False
+        except (TypeError, ValueError):
+            # None, or a value of another type, is never in a range
+            return False
+    return True
+
+
+def matches(obj: TypeVar('Base'), attributes: dict) -> bool:
+    """ Tell whether an object meets all the conditions of a query
+    """
+    for k, v in attributes.items():
+        if not match_value(getattr(obj, k), v):
+            return False
+    return True
+
+
+def index_value(value: Any) -> Any:
+    """ Return the value indexes store for an attribute value:
+    datetimes become strings in TIMESTAMP_FORMAT, which sort the same
+    """
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def attribute_index_value(obj: TypeVar('Base'), attr: str) -> Any:
+    """ Return the value indexes store for an attribute of an object
+    Timestamps are read as the strings they are kept as, without
+    building a datetime
+    """
+    descriptor = getattr(type(obj), attr, None)
+    if hasattr(descriptor, 'to_string'):
+        try:
+            return descriptor.to_string(obj)
+        except AttributeError:
+            return None
+    return index_value(getattr(obj, attr, None))
+
+
+# Orders of Base.page: each object is sorted by its key, a tuple
+# ending with its id so that no two keys are equal
+ORDERS = ('id', 'created_at')
+
+
+def sort_key(obj_json: dict, order_by: str) -> tuple:
+    """ Return the key of an object in an order, from its JSON
+    """
+    if order_by == 'created_at':
+        return (obj_json.get('created_at') or "", obj_json.get('id'))
+    return (obj_json.get('id'),)
+
+
+def object_sort_key(obj: TypeVar('Base'), order_by: str) -> tuple:
+    """ Return the key of an object in an order
+    """
+    if order_by == 'created_at':
+        # Same string as in its JSON, without building a datetime
+        return (type(obj).created_at.to_string(obj), obj.id)
+    return (obj.id,)
+
+
+def parse_cursor(cursor: str, order_by: str) -> tuple:
+    """ Return the key encoded in a cursor
+    Raise ValueError if it is not the cursor of a key in this order
+    """
+    if order_by == 'created_at':
+        key = tuple(cursor.split(",", 1))
+        if len(key) != 2 or key[1] == "":
+            raise ValueError("cursor must be <created_at>,<id>")
+        if key[0] != "":
+            # Empty for an object without created_at, see sort_key
+            try:
+                _parse_timestamp(key[0])
+            except ValueError:
+                raise ValueError("cursor must start with a created_at "
+                                 "in {}".format(TIMESTAMP_FORMAT)) from None
+        return key
+    if cursor == "":
+        raise ValueError("cursor must be an id")
+    return (cursor,)
+
+
+def make_cursor(key: tuple) -> str:
+    """ Return the cursor encoding a key
+    """
+    return ",".join(key)
+
+
+class Storage():
+    """ Storage backend interface
+
+    Base delegates persistence and lookups to one instance of a
+    subclass, selected by the STORAGE_BACKEND environment variable
+    """
+
+    def load(self, cls: type):
+        """ Load all objects of a class
+        """
+        raise NotImplementedError()
+
+    def reload(self, cls: type):
+        """ Apply the changes made by other processes since the load,
+        by loading all objects again unless the backend knows better
+        """
+        self.load(cls)
+
+    def save_all(self, cls: type):
+        """ Persist all objects of a class
+        """
+        raise NotImplementedError()
+
+    def save(self, obj: TypeVar('Base')):
+        """ Add or update an object
+        """
+        raise NotImplementedError()
+
+    def remove(self, obj: TypeVar('Base')):
+        """ Remove an object
+        """
+        raise NotImplementedError()
+
+    def count(self, cls: type, query: dict = None) -> int:
+        """ Count the objects of a class meeting a query, or all of them
+        """
+        raise NotImplementedError()
+
+    def get(self, cls: type, id: str) -> TypeVar('Base'):
+        """ Return one object of a class by ID, or None
+        """
+        raise NotImplementedError()
+
+    def search(self, cls: type,
+               attributes: dict = {}) -> List[TypeVar('Base')]:
+        """ Return the objects of a class with matching attributes
+        """
+        raise NotImplementedError()
+
+    def first(self, cls: type, query: dict = {}) -> TypeVar('Base'):
+        """ Return one object of a class meeting a query, or None
+        """
+        objs = self.search(cls, query)
+        return objs[0] if len(objs) > 0 else None
+
+    def page(self, cls: type, limit: int = None, cursor: str = None,
+             order_by: str = 'id') -> Tuple[List[TypeVar('Base')],
+                                            Optional[str]]:
+        """ Return up to limit objects of a class sorted by order_by,
+        after the cursor, and the cursor of the next page, or None
+        """
+        keyed = [(object_sort_key(obj, order_by), obj)
+                 for obj in self.search(cls)]
+        if cursor is not None:
+            after = parse_cursor(cursor, order_by)
+            keyed = [(key, obj) for key, obj in keyed if key > after]
+        keyed.sort(key=lambda item: item[0])
+        if limit is None or len(keyed) <= limit:
+            return [obj for key, obj in keyed], None
+        return ([obj for key, obj in keyed[:limit]],
+                make_cursor(keyed[limit - 1][0]))
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+""" Flusher module
+Background writer used by Base in the "deferred" storage mode
+"""
+import atexit
+import logging
+import signal
+import threading
+from os import getenv
+from typing import Set
+
+
+# Delay, in milliseconds, between two flushes of the dirty classes
+FLUSH_INTERVAL_MS = int(getenv('STORAGE_FLUSH_INTERVAL_MS', 1000))
+# Number of changes that triggers a flush before the delay is over
+FLUSH_CHANGES = int(getenv('STORAGE_FLUSH_CHANGES', 100))
+
+logger = logging.getLogger(__name__)
+
+
+class Flusher():
+    """ Coalesces the writes of Base classes
+
+    Changes only mark their class as dirty; a background thread calls
+    save_to_file on the dirty classes every FLUSH_INTERVAL_MS, or as soon
+    as FLUSH_CHANGES changes are pending. Pending changes are also
+    flushed at exit and on SIGTERM. Classes that fail to be written
+    stay dirty, and are written again by the next flush
+    """
+
+    def __init__(self, interval_ms: int = FLUSH_INTERVAL_MS,
+                 max_changes: int = FLUSH_CHANGES):
+        """ Initialize the flusher and start its thread
+        Raise RuntimeError outside of the main thread
+        """
+        self.interval = interval_ms / 1000
+        self.max_changes = max_changes
+        self._dirty: Set[type] = set()
+        self._changes = 0
+        self._condition = threading.Condition()
+        # Reentrant: SIGTERM may come while the main thread flushes
+        self._flush_lock = threading.RLock()
+        self._flushing = False
+        self._exiting = False
+        # SIGTERM received during a flush of the main thread, handed
+        # over once the flush is done
+        self._signal = None
+        if threading.current_thread() is not threading.main_thread():
+            # Signal handlers can only be set from the main thread, and
+            # without one SIGTERM would lose every pending change
+            raise RuntimeError("The flusher must be created on the main "
+                               "thread, to flush on SIGTERM")
+        self._previous_handler = signal.signal(signal.SIGTERM,
+                                               self._on_sigterm)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self._flush_at_exit)
+
+    def mark_dirty(self, cls: type):
+        """ Record a change to the objects of a class
+        """
+        with self._condition:
+            self._dirty.add(cls)
+            self._changes += 1
+            if self._changes >= self.max_changes:
+                self._condition.notify()
+
+    def flush(self):
+        """ Write every dirty class to its file
+        Raise the first error met, once the other classes are written
+        """
+        with self._flush_lock:
+            self._flushing = True
+            try:
+                self._write_dirty()
+            finally:
+                self._flushing = False
+                received, self._signal = self._signal, None
+                if received is not None:
+                    self._terminate(*received)
+
+    def _write_dirty(self):
+        """ Write every dirty class to its file, marking those that
+        fail as dirty again
+        Called with the flush lock held
+        """
+        with self._condition:
+            dirty = self._dirty
+            self._dirty = set()
+            self._changes = 0
+        failed = []
+        error = None
+        for cls in dirty:
+            try:
+                cls.save_to_file()
+            except Exception as e:
+                failed.append(cls)
+                error = error or e
+        if error is not None:
+            with self._condition:
+                self._dirty.update(failed)
+            raise error
+
+    def _flush_at_exit(self):
+        """ Write every dirty class to its file, as the process exits
+        """
+        self._exiting = True
+        self.flush()
+
+    def _run(self):
+        """ Flush the dirty classes until the process exits
+        """
+        while True:
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._changes >= self.max_changes,
+                    timeout=self.interval)
+            try:
+                self.flush()
+            except Exception:
+                # A full disk or a missing directory must not stop the
+                # thread: the classes are written again next time
+                logger.exception("Flushing the dirty classes failed")
+
+    def _on_sigterm(self, signum, frame):
+        """ Flush, then hand SIGTERM over to the previous handler
+        If SIGTERM interrupted a flush of the main thread, that flush
+        hands it over once done, or just ends at exit
+        """
+        with self._flush_lock:
+            if self._flushing:
+                if not self._exiting:
+                    self._signal = (signum, frame)
+                return
+        self.flush()
+        self._terminate(signum, frame)
+
+    def _terminate(self, signum, frame):
+        """ Hand SIGTERM over to the previous handler, or exit
+        """
+        if callable(self._previous_handler):
+            self._previous_handler(signum, frame)
+        else:
+            raise SystemExit(128 + signum)
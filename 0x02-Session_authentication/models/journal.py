@@ -0,0 +1,280 @@
+#!/usr/bin/env python3
+""" Journal module
+Append-only change log used by Base in the "journal" storage mode
+"""
+import contextlib
+import fcntl
+import glob
+import json
+import os
+import threading
+from os import getenv, path
+from typing import Callable, Iterator, List, Optional
+
+
+# Size of the journal file, in bytes, above which it is compacted
+COMPACT_THRESHOLD = int(getenv('STORAGE_JOURNAL_MAX_BYTES', 1024 * 1024))
+
+
+def write_snapshot(file_path: str, objs_json: dict):
+    """ Atomically replace a JSON snapshot file: the data is written
+    to a temporary file, synced, then renamed over the snapshot
+    """
+    tmp_path = "{}.tmp".format(file_path)
+    with open(tmp_path, 'w') as f:
+        json.dump(objs_json, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, file_path)
+
+
+class Journal():
+    """ Append-only log of the changes made to the objects of a class
+
+    Each save or remove appends one JSON line to .db_<Class>.journal,
+    written with a single write call so a crash can at most leave a
+    truncated last line, which replay ignores. Once the journal grows
+    past COMPACT_THRESHOLD, it is renamed to .db_<Class>.journal.compacting
+    and a background thread folds it into the .db_<Class>.json snapshot
+
+    Several processes can share the journal: appends hold a shared
+    flock on .db_<Class>.journal.lock, which the rename holds
+    exclusively, so that no entry is written to the renamed file, and
+    one process at a time compacts, holding an exclusive flock on
+    .db_<Class>.journal.compacting.lock
+
+    The journal also serves as a change feed between processes: replay
+    and follow remember how far the journal file was read, so that the
+    entries other processes append can be read without a full replay
+    """
+
+    def __init__(self, s_class: str,
+                 write: Optional[Callable[[dict], None]] = None):
+        """ Initialize the journal of a class
+        write replaces the snapshot with the JSON of all objects,
+        by default in .db_<Class>.json
+        """
+        self.snapshot_path = ".db_{}.json".format(s_class)
+        self._write = write or (
+            lambda objs_json: write_snapshot(self.snapshot_path, objs_json))
+        self.file_path = ".db_{}.journal".format(s_class)
+        self.compacting_path = "{}.compacting".format(self.file_path)
+        self._lock = threading.Lock()
+        self._fd = None
+        self._append_lock = "{}.lock".format(self.file_path)
+        self._compact_lock = "{}.lock".format(self.compacting_path)
+        # Open files of the locks, by path
+        self._lock_fds = {}
+        self._compactor = None
+        # Inode of the journal file and offset of its first unread entry
+        self.version = (None, 0)
+
+    def _lock_fd(self, lock_path: str) -> int:
+        """ Return the open file of a lock file
+        """
+        fd = self._lock_fds.get(lock_path)
+        if fd is None:
+            fd = self._lock_fds[lock_path] = os.open(
+                lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+        return fd
+
+    @contextlib.contextmanager
+    def _flock(self, lock_path: str, operation: int):
+        """ Hold a flock on a lock file, shared with the other processes
+        """
+        fd = self._lock_fd(lock_path)
+        fcntl.flock(fd, operation)
+        try:
+            yield
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+
+    def append(self, op: str, obj_id: str, obj_json: dict = None,
+               snapshot: Callable[[], dict] = None):
+        """ Append a "save" or "remove" entry for an object, then start
+        a compaction if the journal is over the size threshold
+        snapshot applies the entries of the other processes, then
+        returns the current objects of the class, or the JSON of those
+        not built yet, to compact into
+        """
+        entry = {"op": op, "id": obj_id}
+        if obj_json is not None:
+            entry["obj"] = obj_json
+        line = (json.dumps(entry) + "\n").encode('utf-8')
+        with self._lock:
+            with self._flock(self._append_lock, fcntl.LOCK_SH):
+                self._reopen()
+                size = os.fstat(self._fd).st_size
+                if size > 0 and os.pread(self._fd, 1, size - 1) != b"\n":
+                    # A crash, here or in another process, left a
+                    # truncated last line: end it, so that replay only
+                    # drops that one
+                    line = b"\n" + line
+                os.write(self._fd, line)
+                size += len(line)
+            if snapshot is not None and size > COMPACT_THRESHOLD:
+                self._start_compaction(snapshot)
+
+    def _reopen(self):
+        """ Open the journal file, again if another process renamed or
+        removed the one open, so that entries are not appended to it
+        Called with the locks held
+        """
+        if self._fd is not None:
+            try:
+                current = os.stat(self.file_path).st_ino
+            except FileNotFoundError:
+                current = None
+            if current != os.fstat(self._fd).st_ino:
+                os.close(self._fd)
+                self._fd = None
+        if self._fd is None:
+            self._fd = os.open(self.file_path,
+                               os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+
+    def _start_compaction(self, snapshot: Callable[[], dict]):
+        """ Rotate the journal and compact it in a background thread,
+        unless another process, or thread, is compacting it
+        Called with the lock held
+        """
+        if self._compactor is not None and self._compactor.is_alive():
+            return
+        compact_fd = self._lock_fd(self._compact_lock)
+        try:
+            # Released by the compactor thread
+            fcntl.flock(compact_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            # Another process is compacting
+            return
+        try:
+            with self._flock(self._append_lock, fcntl.LOCK_EX):
+                # Every entry appended so far, by any process, is applied
+                # to the objects collected, and none is appended to the
+                # journal once renamed
+                objs = snapshot()
+                if not path.exists(self.compacting_path):
+                    os.replace(self.file_path, self.compacting_path)
+                    self.version = (None, 0)
+                # Else a compaction was interrupted: the objects hold its
+                # entries too, and the journal is replayed over them
+        except BaseException:
+            fcntl.flock(compact_fd, fcntl.LOCK_UN)
+            raise
+        # Not a daemon: the process exits once the snapshot is written
+        self._compactor = threading.Thread(target=self._compact,
+                                           args=(objs,))
+        self._compactor.start()
+
+    @staticmethod
+    def _to_json(objs: dict) -> dict:
+        """ Return the JSON of objects by ID
+        """
+        # Objects not built yet, in lazy mode, are still JSON dicts
+        return {obj_id: obj if type(obj) is dict else obj.to_json(True)
+                for obj_id, obj in objs.items()}
+
+    def _compact(self, objs: dict):
+        """ Write the snapshot, then drop the compacted journal and
+        release the compaction lock
+        """
+        try:
+            self._remove_temporary()
+            self._write(self._to_json(objs))
+            os.remove(self.compacting_path)
+        finally:
+            fcntl.flock(self._lock_fd(self._compact_lock), fcntl.LOCK_UN)
+
+    def _remove_temporary(self):
+        """ Remove the temporary files a snapshot write interrupted by a
+        crash left behind
+        Called with the compaction lock held: no other write is running
+        """
+        # .db_<Class>.json.tmp, .db_<Class>.bin.tmp, or those of shards
+        prefix = self.snapshot_path[:-len(".json")]
+        for file_path in glob.glob(glob.escape(prefix) + ".*.tmp"):
+            os.remove(file_path)
+
+    def checkpoint(self, objs_json: dict,
+                   snapshot: Callable[[], dict] = None):
+        """ Write a full snapshot of the class and drop all entries
+        snapshot, as for append, replaces objs_json when given, so
+        that the entries of the other processes are not dropped
+        """
+        with self._lock:
+            self.wait()
+            with self._flock(self._compact_lock, fcntl.LOCK_EX), \
+                    self._flock(self._append_lock, fcntl.LOCK_EX):
+                if snapshot is not None:
+                    objs_json = self._to_json(snapshot())
+                self._remove_temporary()
+                self._write(objs_json)
+                if self._fd is not None:
+                    os.close(self._fd)
+                    self._fd = None
+                for file_path in (self.compacting_path, self.file_path):
+                    if path.exists(file_path):
+                        os.remove(file_path)
+                self.version = (None, 0)
+
+    def wait(self):
+        """ Wait for a running compaction to finish
+        """
+        if self._compactor is not None:
+            self._compactor.join()
+            self._compactor = None
+
+    def replay(self) -> Iterator[dict]:
+        """ Yield the entries to apply over the snapshot, in order
+        """
+        self.version = (None, 0)
+        if path.exists(self.compacting_path):
+            with open(self.compacting_path, 'rb') as f:
+                yield from self._entries(f.read())
+        for entry in self.follow() or ():
+            yield entry
+
+    def has_changes(self) -> bool:
+        """ Tell whether the journal file was appended to or replaced
+        since the last replay or follow
+        """
+        inode, offset = self.version
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return inode is not None
+        return (stat.st_ino, stat.st_size) != (inode, offset)
+
+    def follow(self) -> Optional[List[dict]]:
+        """ Return the entries appended since the last replay or follow,
+        or None if the journal file was replaced meanwhile, by a
+        compaction or a checkpoint: the snapshot must then be reloaded
+        """
+        inode, offset = self.version
+        try:
+            f = open(self.file_path, 'rb')
+        except FileNotFoundError:
+            return [] if inode is None else None
+        with f:
+            current = os.fstat(f.fileno()).st_ino
+            if inode is None:
+                offset = 0
+            elif current != inode:
+                return None
+            f.seek(offset)
+            data = f.read()
+        # An entry being written by another process is read next time
+        end = data.rfind(b"\n") + 1
+        self.version = (current, offset + end)
+        return list(self._entries(data[:end]))
+
+    @staticmethod
+    def _entries(data: bytes) -> Iterator[dict]:
+        """ Yield the entries of journal lines
+        """
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                # Truncated by a crash in the middle of a write
+                continue
+            yield entry
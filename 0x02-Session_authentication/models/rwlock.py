@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+""" Reader-writer lock module
+Locks used by the JSON storage in its thread-safe mode
+"""
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+
+class RWLock():
+    """ Lock shared by any number of readers or held by one writer
+
+    Waiting writers go first: new readers wait for them, so a steady
+    flow of searches cannot starve save and remove. The lock is not
+    reentrant: a thread holding it must not acquire it again
+    """
+
+    def __init__(self):
+        """ Initialize the lock
+        """
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._writer = False
+        self._waiting_writers = 0
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Hold the lock as a reader
+        """
+        with self._condition:
+            self._condition.wait_for(
+                lambda: not self._writer and self._waiting_writers == 0)
+            self._readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if self._readers == 0:
+                    self._condition.notify_all()
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Hold the lock as the writer
+        """
+        with self._condition:
+            self._waiting_writers += 1
+            self._condition.wait_for(
+                lambda: not self._writer and self._readers == 0)
+            self._waiting_writers -= 1
+            self._writer = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writer = False
+                self._condition.notify_all()
+
+
+class NoLock():
+    """ Stand-in for RWLock when the storage is not shared by threads
+    """
+
+    @contextmanager
+    def read(self) -> Iterator[None]:
+        """ Do nothing
+        """
+        yield
+
+    @contextmanager
+    def write(self) -> Iterator[None]:
+        """ Do nothing
+        """
+        yield
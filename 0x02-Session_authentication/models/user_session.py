@@ -10,6 +10,10 @@ class UserSession(Base):
     UserSession model for storing session data
     """
 
+    __slots__ = ('user_id', 'session_id')
+
+    INDEXES = ('session_id',)
+
     def __init__(self, *args: list, **kwargs: dict):
         """
         Initialize a UserSession instance